@@ -1,20 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Form
-from models.database import PaginatedResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from database.connection import get_db
+from models.database import AccesoQuery, PaginatedResponse
 from typing import Optional
 from services.acceso_service import AccesoService
 from models.enums import TipoAccesoEnum
+from api.uploads import read_image_upload
 
 router = APIRouter(prefix="/accesos", tags=["accesos"])
 
 @router.get("", response_model=PaginatedResponse)
 async def obtener_accesos(
-    empleado_id: Optional[int] = None,
-    area_id: Optional[str] = None,
-    tipo_acceso: Optional[str] = None,
-    fecha_inicio: Optional[str] = None,
-    fecha_fin: Optional[str] = None,
+    filtros: AccesoQuery = Depends(),
     page: int = Query(1, ge=1, description="Page number starting from 1"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of items per page (max 100)")
+    page_size: int = Query(10, ge=1, le=100, description="Number of items per page (max 100)"),
+    cursor: Optional[str] = Query(None, description="pagination.next_cursor of the previous page (keyset pagination)"),
+    db: Session = Depends(get_db)
 ):
     """
     Obtiene lista de accesos con filtros opcionales y paginación
@@ -23,52 +25,59 @@ async def obtener_accesos(
     - empleado_id: Filtrar por ID de empleado
     - area_id: Filtrar por ID de área
     - tipo_acceso: Filtrar por tipo de acceso (Ingreso/Salida)
-    - fecha_inicio: Filtrar desde esta fecha (formato YYYY-MM-DD)
-    - fecha_fin: Filtrar hasta esta fecha (formato YYYY-MM-DD)
+    - fecha_inicio: Filtrar desde esta fecha (formato YYYY-MM-DD o ISO 8601)
+    - fecha_fin: Filtrar hasta esta fecha (formato YYYY-MM-DD o ISO 8601)
     - page: Número de página (comienza en 1)
     - page_size: Cantidad de elementos por página (máx. 100)
+    - cursor: pagination.next_cursor de la página anterior; si se envía, se ignora page
+      y se devuelve la página siguiente con costo constante, sin total ni número de página
     
     Los resultados se ordenan por fecha y hora de acceso en orden descendente (más recientes primero)
     """
-    service = AccesoService()
-    offset = (page - 1) * page_size
-    return service.get_all_accesos(
-        empleado_id=empleado_id,
-        area_id=area_id,
-        tipo_acceso=tipo_acceso,
-        fecha_inicio=fecha_inicio,
-        fecha_fin=fecha_fin,
+    service = AccesoService(db)
+    offset = 0 if cursor is not None else (page - 1) * page_size
+    # Igual que en /empleados: se serializa directo con orjson, sin revalidar
+    # cada fila contra response_model (que queda para la documentación)
+    return ORJSONResponse(service.get_all_accesos(
+        empleado_id=filtros.empleado_id,
+        area_id=filtros.area_id,
+        tipo_acceso=filtros.tipo_acceso,
+        fecha_inicio=filtros.fecha_inicio,
+        fecha_fin=filtros.fecha_fin,
         limit=page_size,
         offset=offset,
         page=page,
-        page_size=page_size
-    )
+        page_size=page_size,
+        cursor=cursor
+    ))
 
 @router.get("/{acceso_id}")
-async def obtener_acceso(acceso_id: int):
+async def obtener_acceso(acceso_id: int, db: Session = Depends(get_db)):
     """
     Obtiene un acceso específico por ID
     """
-    service = AccesoService()
+    service = AccesoService(db)
     return service.get_acceso(acceso_id)
 
 @router.post("/crear")
 async def crear_acceso(
+    request: Request,
     file: UploadFile = File(...),
     tipo_acceso: TipoAccesoEnum = Form(...),
     area_id: str = Form(...),
     dispositivo: str = Form("Dispositivo1"),
+    db: Session = Depends(get_db),
 ):
     """
     Crea un nuevo acceso después de reconocer facialmente al empleado.
     Solo registra accesos cuando son permitidos.
     Si el empleado no es reconocido o no tiene permisos para el área, devuelve error sin crear registro.
     """
-    # Leer imagen subida
-    contents = await file.read()
+    # Leer imagen subida (máx. 5 MB)
+    contents = await read_image_upload(request, file)
     
-    service = AccesoService()
-    return service.create_facial_access(contents, tipo_acceso, area_id, dispositivo)
+    service = AccesoService(db)
+    return await service.create_facial_access(contents, tipo_acceso, area_id, dispositivo)
 
 @router.post("/crear_pin")
 async def crear_acceso_pin(
@@ -76,10 +85,11 @@ async def crear_acceso_pin(
     tipo_acceso: TipoAccesoEnum = Form(...),
     area_id: str = Form(...),
     dispositivo: str = Form("Dispositivo1"),
+    db: Session = Depends(get_db),
 ):
     """
     Crea un nuevo acceso mediante PIN.
     Solo registra accesos cuando son permitidos.
     """
-    service = AccesoService()
+    service = AccesoService(db)
     return service.create_pin_access(pin, tipo_acceso, area_id, dispositivo)
@@ -1,20 +1,22 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from database.connection import get_db
 from services.area_service import AreaService
 
 router = APIRouter(prefix="/areas", tags=["areas"])
 
 @router.get("")
-async def obtener_areas():
+async def obtener_areas(db: Session = Depends(get_db)):
     """
     Obtiene lista de todas las áreas disponibles
     """
-    service = AreaService()
+    service = AreaService(db)
     return service.get_all_areas()
 
 @router.get("/{area_id}")
-async def obtener_area(area_id: str):
+async def obtener_area(area_id: str, db: Session = Depends(get_db)):
     """
     Obtiene información de un área específica
     """
-    service = AreaService()
+    service = AreaService(db)
     return service.get_area(area_id)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from database.connection import get_db
 from services.empleado_service import EmpleadoService
 from services.face_recognition_service import FaceRecognitionService
 from models.database import EmpleadoCreate, EmpleadoResponse, PaginatedResponse
-import json
+from api.uploads import read_image_upload
 from typing import Optional
 
 router = APIRouter(prefix="/empleados", tags=["empleados"])
@@ -12,7 +15,8 @@ async def obtener_empleados(
     nombre: Optional[str] = None,
     include_inactive: bool = False,
     page: int = Query(1, ge=1, description="Page number starting from 1"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of items per page")
+    page_size: int = Query(10, ge=1, le=100, description="Number of items per page"),
+    db: Session = Depends(get_db)
 ):
     """
     Obtiene lista de empleados con paginación y filtros
@@ -23,28 +27,30 @@ async def obtener_empleados(
     - page: Número de página (comienza en 1)
     - page_size: Cantidad de elementos por página (máx. 100)
     """
-    service = EmpleadoService()
-    return service.get_all_empleados(
+    service = EmpleadoService(db)
+    # Se devuelve la respuesta directamente: los datos vienen de la base y no hace
+    # falta revalidar cada fila contra response_model (que queda para la documentación)
+    return ORJSONResponse(service.get_all_empleados(
         nombre=nombre,
         include_inactive=include_inactive,
         page=page,
         page_size=page_size
-    )
+    ))
 
 @router.get("/{empleado_id}", response_model=EmpleadoResponse)
-async def obtener_empleado(empleado_id: int):
+async def obtener_empleado(empleado_id: int, db: Session = Depends(get_db)):
     """Obtiene un empleado específico por ID"""
-    service = EmpleadoService()
-    return service.get_empleado(empleado_id)
+    service = EmpleadoService(db)
+    return ORJSONResponse(service.get_empleado(empleado_id))
 
 @router.get("/{empleado_id}/completo")
-async def obtener_empleado_completo(empleado_id: int):
+async def obtener_empleado_completo(empleado_id: int, db: Session = Depends(get_db)):
     """Obtiene información completa de un empleado (incluye datos sensibles)"""
-    service = EmpleadoService()
+    service = EmpleadoService(db)
     return service.get_empleado_completo(empleado_id)
 
 @router.post("/crear", response_model=dict)
-async def crear_empleado(empleado_data: EmpleadoCreate):
+async def crear_empleado(empleado_data: EmpleadoCreate, db: Session = Depends(get_db)):
     """
     Crea un nuevo empleado en la base de datos.
     
@@ -60,26 +66,27 @@ async def crear_empleado(empleado_data: EmpleadoCreate):
     
     Devuelve el ID del empleado creado.
     """
-    service = EmpleadoService()
+    service = EmpleadoService(db)
     return service.create_empleado(empleado_data)
 
 @router.post("/{empleado_id}/registrar_rostro")
-async def registrar_rostro(empleado_id: int, file: UploadFile = File(...)):
+async def registrar_rostro(empleado_id: int, request: Request, file: UploadFile = File(...),
+                           db: Session = Depends(get_db)):
     """Registra el rostro de un empleado para reconocimiento facial"""
-    # Leer imagen subida
-    contents = await file.read()
+    # Leer imagen subida (máx. 5 MB)
+    contents = await read_image_upload(request, file)
     
-    # Extraer encoding facial
+    # Extraer encoding facial fuera del event loop, a resolución completa
+    # para que el rostro enrolado tenga la mejor calidad posible
     face_service = FaceRecognitionService()
-    face_encoding = face_service.extract_face_encoding(contents)
-    encoding_json = json.dumps(face_encoding)
+    face_encoding = await face_service.extract_face_encoding_async(contents, max_dimension=None)
     
     # Registrar en base de datos
-    service = EmpleadoService()
-    return service.register_face(empleado_id, encoding_json)
+    service = EmpleadoService(db)
+    return service.register_face(empleado_id, face_encoding)
 
 @router.delete("/{empleado_id}", response_model=dict)
-async def eliminar_empleado(empleado_id: int):
+async def eliminar_empleado(empleado_id: int, db: Session = Depends(get_db)):
     """
     Elimina un empleado de la base de datos por su EmpleadoID.
     
@@ -87,5 +94,5 @@ async def eliminar_empleado(empleado_id: int):
     
     Devuelve un mensaje de confirmación si la operación fue exitosa.
     """
-    service = EmpleadoService()
+    service = EmpleadoService(db)
     return service.delete_empleado(empleado_id)
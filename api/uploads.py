@@ -0,0 +1,28 @@
+import io
+from fastapi import HTTPException, Request, UploadFile
+
+# Tamaño máximo aceptado para las imágenes de rostros
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+# Tamaño de cada bloque leído del archivo subido
+CHUNK_SIZE = 64 * 1024
+
+async def read_image_upload(request: Request, file: UploadFile) -> bytes:
+    """
+    Lee la imagen subida por bloques, cortando apenas supera MAX_UPLOAD_SIZE.
+    
+    Starlette ya guarda en disco los archivos grandes al parsear el formulario;
+    esto evita volver a cargarlos enteros en memoria antes de validar su tamaño.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="La imagen supera el tamaño máximo permitido (5 MB)")
+    
+    buffer = io.BytesIO()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if buffer.tell() + len(chunk) > MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=413, detail="La imagen supera el tamaño máximo permitido (5 MB)")
+        buffer.write(chunk)
+    return buffer.getvalue()
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from models.database import Base
 
@@ -12,10 +13,34 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL is None:
     raise ValueError("La variable de entorno DATABASE_URL no está definida")
     
+# Con psycopg2 los executemany se envían como INSERT de múltiples filas
+# (VALUES paginado) y el resto de sentencias con execute_batch.
+# El pool mantiene DB_POOL_SIZE conexiones abiertas entre peticiones (más
+# DB_MAX_OVERFLOW temporales), verifica cada conexión antes de usarla y las
+# renueva cada 30 minutos para no usar conexiones cortadas por el servidor.
+engine_options = {}
+if make_url(DATABASE_URL).drivername in ("postgresql", "postgresql+psycopg2"):
+    engine_options = {
+        "executemany_mode": "values_plus_batch",
+        "executemany_values_page_size": 1000,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
 # Crear motor de conexión
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options)
 # Crear tablas si no existen
 Base.metadata.create_all(bind=engine)
 
 # Crear sesión para insertar datos
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def get_db():
+    """Dependencia de FastAPI: una sesión por petición, cerrada al terminar"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
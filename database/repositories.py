@@ -1,9 +1,63 @@
 from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import Session, contains_eager, defer
+from sqlalchemy import or_, and_, func, select, bindparam, delete
 from models.database import Empleado, Area, Acceso
 from datetime import datetime, timezone
 
+
+def _optional_eq(column, name: str):
+    """Build ``(:name IS NULL OR column = :name)`` so an absent filter can be bound as NULL."""
+    param = bindparam(name, type_=column.type)
+    return or_(param.is_(None), column == param)
+
+
+# Statements for AccesoRepository.get_all_with_employee_info, built once at import.
+# Every filter is always bound (NULL when absent), so each statement is compiled a
+# single time and reused from SQLAlchemy's compiled cache. psycopg2 interpolates the
+# parameters client-side, so PostgreSQL still folds away the NULL branches and can
+# use the accesos indexes for the filters that are present.
+_accesos = Acceso.__table__.c
+_fecha_inicio = bindparam("fecha_inicio", type_=_accesos.FechaHora.type)
+_fecha_fin = bindparam("fecha_fin", type_=_accesos.FechaHora.type)
+
+_ACCESOS_FILTER = and_(
+    _optional_eq(_accesos.EmpleadoID, "empleado_id"),
+    _optional_eq(_accesos.AreaID, "area_id"),
+    _optional_eq(_accesos.TipoAcceso, "tipo_acceso"),
+    _optional_eq(_accesos.AccesoPermitido, "acceso_permitido"),
+    or_(_fecha_inicio.is_(None), _accesos.FechaHora >= _fecha_inicio),
+    or_(_fecha_fin.is_(None), _accesos.FechaHora <= _fecha_fin)
+)
+
+# Keyset pagination: continue right after the (FechaHora, AccesoID) key of the last row
+# of the previous page. The key values are bound directly, so the page is still correct
+# if that row has been deleted since.
+_cursor_fecha = bindparam("cursor_fecha", type_=_accesos.FechaHora.type)
+_cursor_id = bindparam("cursor_id", type_=_accesos.AccesoID.type)
+_ACCESOS_AFTER_CURSOR = or_(
+    _cursor_id.is_(None),
+    _accesos.FechaHora < _cursor_fecha,
+    and_(_accesos.FechaHora == _cursor_fecha, _accesos.AccesoID < _cursor_id)
+)
+
+_ACCESOS_COUNT = select(func.count()).select_from(Acceso).where(_ACCESOS_FILTER)
+
+_ACCESOS_PAGE = select(
+    Acceso,
+    Empleado.Nombre.label('NombreEmpleado'),
+    Empleado.Apellido,
+    Empleado.DNI,
+    Empleado.Rol,
+    Area.Nombre.label('NombreArea')
+)\
+    .outerjoin(Empleado, Acceso.EmpleadoID == Empleado.EmpleadoID)\
+    .outerjoin(Area, Acceso.AreaID == Area.AreaID)\
+    .where(_ACCESOS_FILTER, _ACCESOS_AFTER_CURSOR)\
+    .order_by(Acceso.FechaHora.desc(), Acceso.AccesoID.desc())\
+    .limit(bindparam("limit", type_=_accesos.AccesoID.type))\
+    .offset(bindparam("offset", type_=_accesos.AccesoID.type))
+
+
 class EmpleadoRepository:
     """Repository for handling database operations for Empleado model."""
     
@@ -34,9 +88,12 @@ class EmpleadoRepository:
                nombre: Optional[str] = None, 
                include_inactive: bool = False,
                limit: int = 10,
-               offset: int = 0) -> Tuple[List[Empleado], int]:
+               offset: int = 0) -> Tuple[List[Tuple[Empleado, bool]], int]:
         """Retrieve all employees with pagination and filtering.
         
+        The encrypted biometric columns are not loaded; whether an employee has
+        them is computed by the database instead.
+        
         Args:
             nombre: Filter by name or last name (case-insensitive partial match)
             include_inactive: Whether to include inactive employees
@@ -44,9 +101,16 @@ class EmpleadoRepository:
             offset: Number of records to skip
             
         Returns:
-            Tuple of (list of employees, total count) ordered by last name and first name
+            Tuple of (list of (employee, has biometric data) pairs, total count)
+            ordered by last name and first name
         """
-        query = self.session.query(Empleado).join(Area)
+        # Load each employee's area from the same JOIN (avoids one lazy load per row)
+        query = self.session.query(Empleado).join(Empleado.area).options(
+            contains_eager(Empleado.area),
+            defer(Empleado.vector_cifrado),
+            defer(Empleado.iv),
+            defer(Empleado.DatosBiometricos)
+        )
         
         # Apply filters
         if not include_inactive:
@@ -61,43 +125,55 @@ class EmpleadoRepository:
                 )
             )
         
-        # Get total count before pagination
-        total = query.count()
-        
-        # Apply pagination and ordering
-        items = query.order_by(Empleado.Apellido, Empleado.Nombre)\
+        # COUNT(*) OVER () is evaluated before LIMIT/OFFSET, so every row of the
+        # page carries the total of matching rows and no separate COUNT is needed
+        tiene_biometricos = and_(Empleado.vector_cifrado.isnot(None), Empleado.iv.isnot(None))
+        rows = query.add_columns(tiene_biometricos.label("tiene_biometricos"),
+                                 func.count().over().label("total"))\
+                    .order_by(Empleado.Apellido, Empleado.Nombre)\
                     .offset(offset)\
                     .limit(limit)\
                     .all()
-                    
-        return items, total
+        
+        if rows:
+            return [(empleado, tiene) for empleado, tiene, _ in rows], rows[0].total
+        
+        # Past the last page there are no rows to read the total from
+        return [], query.count() if offset else 0
     
-    def get_by_dni_or_email(self, dni: str, email: str, include_inactive: bool = False) -> Optional[Empleado]:
-        """Find an employee by DNI or email.
+    def find_id_by_dni_or_email(self, dni: str, email: str, include_inactive: bool = False,
+                                exclude_id: Optional[int] = None) -> Optional[int]:
+        """Return the ID of an employee that already uses the DNI or email.
+        
+        Selects only EmpleadoID with LIMIT 1, so the check is answered from the
+        unique indexes on DNI and Email without loading an employee row.
         
         Args:
             dni: DNI to search for
             email: Email to search for
             include_inactive: Whether to include inactive employees
+            exclude_id: Employee to ignore (the one being updated)
             
         Returns:
-            The employee if found, None otherwise
+            The ID of a matching employee, or None if both are free
         """
-        query = self.session.query(Empleado).filter(
+        stmt = select(Empleado.EmpleadoID).where(
             or_(
                 Empleado.DNI == dni,
                 Empleado.Email == email
             )
         )
         if not include_inactive:
-            query = query.filter(Empleado.estado == 'activo')
-        return query.first()
+            stmt = stmt.where(Empleado.estado == 'activo')
+        if exclude_id is not None:
+            stmt = stmt.where(Empleado.EmpleadoID != exclude_id)
+        return self.session.execute(stmt.limit(1)).scalar()
     
-    def get_by_pin_and_area(self, pin: str, area_id: str) -> Optional[Empleado]:
-        """Find an employee by PIN and area.
+    def get_by_pin_hash_and_area(self, pin_hash: str, area_id: str) -> Optional[Empleado]:
+        """Find an employee by PIN hash and area.
         
         Args:
-            pin: Employee's PIN
+            pin_hash: Hash of the employee's PIN (see utils.crypto_utils.hash_pin)
             area_id: Area ID to search in
             
         Returns:
@@ -105,30 +181,34 @@ class EmpleadoRepository:
         """
         return self.session.query(Empleado).filter(
             and_(
-                Empleado.PIN == pin,
+                Empleado.PINHash == pin_hash,
                 Empleado.AreaID == area_id,
                 Empleado.estado == 'activo'
             )
         ).first()
     
-    def get_with_biometric_data(self, include_inactive: bool = False) -> List[Empleado]:
-        """Retrieve employees with registered biometric data.
+    def get_biometric_vectors(self, area_id: Optional[str] = None) -> List[Tuple[int, bytes, bytes]]:
+        """Retrieve only the encrypted face vectors of active employees.
+        
+        Projects the three columns needed for recognition instead of loading
+        full Empleado rows, so no ORM objects or relationships are built.
         
         Args:
-            include_inactive: Whether to include inactive employees
+            area_id: Only return employees assigned to this area
             
         Returns:
-            List of employees with biometric data and their area information
+            List of (EmpleadoID, vector_cifrado, iv) rows
         """
-        query = self.session.query(Empleado).options(
-            joinedload(Empleado.area)  # Ensure we load the related area
+        query = self.session.query(
+            Empleado.EmpleadoID, Empleado.vector_cifrado, Empleado.iv
         ).filter(
             Empleado.vector_cifrado.isnot(None),
-            Empleado.iv.isnot(None)
+            Empleado.iv.isnot(None),
+            Empleado.estado == 'activo'
         )
         
-        if not include_inactive:
-            query = query.filter(Empleado.estado == 'activo')
+        if area_id is not None:
+            query = query.filter(Empleado.AreaID == area_id)
             
         return query.all()
     
@@ -198,13 +278,13 @@ class EmpleadoRepository:
             self.session.rollback()
             raise ValueError(f"Error updating employee: {str(e)}")
     
-    def update_biometric_data(self, empleado_id: int, vector_encrypted: str, iv: str) -> bool:
+    def update_biometric_data(self, empleado_id: int, vector_encrypted: bytes, iv: bytes) -> bool:
         """Update an employee's biometric data.
         
         Args:
             empleado_id: ID of the employee
-            vector_encrypted: Encrypted facial vector as base64 string
-            iv: Initialization vector as base64 string
+            vector_encrypted: Encrypted facial vector
+            iv: Initialization vector
             
         Returns:
             True if updated successfully, False otherwise
@@ -222,12 +302,14 @@ class EmpleadoRepository:
             self.session.rollback()
             return False
     
-    def delete(self, empleado_id: int, soft_delete: bool = True) -> bool:
+    def delete(self, empleado_id: int, soft_delete: bool = True, commit: bool = True) -> bool:
         """Delete an employee.
         
         Args:
             empleado_id: ID of the employee to delete
             soft_delete: If True, mark as inactive instead of deleting
+            commit: If False, only flush the change and let the caller commit;
+                errors are then raised instead of returning False
             
         Returns:
             True if deleted successfully, False otherwise
@@ -239,14 +321,19 @@ class EmpleadoRepository:
                 
             if soft_delete:
                 empleado.estado = 'inactivo'
-                self.session.commit()
             else:
                 self.session.delete(empleado)
+            
+            if commit:
                 self.session.commit()
+            else:
+                self.session.flush()
                 
             return True
         except Exception:
             self.session.rollback()
+            if not commit:
+                raise
             return False
 
 class AreaRepository:
@@ -410,8 +497,10 @@ class AccesoRepository:
         fecha_inicio: Optional[datetime] = None,
         fecha_fin: Optional[datetime] = None,
         limit: int = 100,
-        offset: int = 0
-    ) -> Tuple[List[Dict[str, Any]], int]:
+        offset: int = 0,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        with_total: bool = True
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[Tuple[datetime, int]]]:
         """Retrieve access records with employee information.
         
         Args:
@@ -422,48 +511,41 @@ class AccesoRepository:
             fecha_inicio: Filter by start date
             fecha_fin: Filter by end date
             limit: Maximum number of records to return
-            offset: Number of records to skip
+            offset: Number of records to skip (ignored when cursor is given)
+            cursor: (FechaHora, AccesoID) of the last record of the previous page. When
+                given, keyset pagination is used so deep pages cost the same as the first one.
+            with_total: Whether to count the matching records; cursor pages skip it
             
         Returns:
-            Tuple of (list of access records, total count)
+            Tuple of (list of access records, total count or None without with_total,
+            (FechaHora, AccesoID) of the last record if more records follow, else None)
         """
-        # Build the base query with joins
-        query = self.session.query(
-            Acceso,
-            Empleado.Nombre.label('NombreEmpleado'),
-            Empleado.Apellido,
-            Empleado.DNI,
-            Empleado.Rol,
-            Area.Nombre.label('NombreArea')
-        )\
-        .join(Empleado, Acceso.EmpleadoID == Empleado.EmpleadoID, isouter=True)\
-        .join(Area, Acceso.AreaID == Area.AreaID, isouter=True)
-        
-        # Apply filters
-        if empleado_id is not None:
-            query = query.filter(Acceso.EmpleadoID == empleado_id)
-        if area_id:
-            query = query.filter(Acceso.AreaID == area_id)
-        if tipo_acceso:
-            query = query.filter(Acceso.TipoAcceso == tipo_acceso)
-        if acceso_permitido:
-            query = query.filter(Acceso.AccesoPermitido == acceso_permitido)
-        if fecha_inicio:
-            query = query.filter(Acceso.FechaHora >= fecha_inicio)
-        if fecha_fin:
-            # Add one day to include the entire end date
-            end_of_day = fecha_fin.replace(hour=23, minute=59, second=59)
-            query = query.filter(Acceso.FechaHora <= end_of_day)
+        # Absent filters are bound as NULL so the same prebuilt statements serve every request
+        params = {
+            "empleado_id": empleado_id,
+            "area_id": area_id or None,
+            "tipo_acceso": tipo_acceso or None,
+            "acceso_permitido": acceso_permitido or None,
+            "fecha_inicio": fecha_inicio or None,
+            # Include the entire end date
+            "fecha_fin": fecha_fin.replace(hour=23, minute=59, second=59) if fecha_fin else None,
+            "cursor_fecha": cursor[0] if cursor is not None else None,
+            "cursor_id": cursor[1] if cursor is not None else None,
+            # One extra row tells whether there is a next page without counting
+            "limit": limit + 1,
+            "offset": 0 if cursor is not None else offset
+        }
         
         # Get total count before pagination
-        total = query.count()
-        
-        # Apply ordering and pagination
-        query = query.order_by(Acceso.FechaHora.desc())
-        query = query.offset(offset).limit(limit)
+        total = self.session.execute(_ACCESOS_COUNT, params).scalar() if with_total else None
         
         # Execute query and format results
-        results = query.all()
+        results = self.session.execute(_ACCESOS_PAGE, params).all()
+        next_key = None
+        if len(results) > limit:
+            results = results[:limit]
+            ultimo = results[-1][0]
+            next_key = (ultimo.FechaHora, ultimo.AccesoID)
         accesos = []
         
         for acceso, nombre_empleado, apellido, dni, rol, nombre_area in results:
@@ -472,11 +554,11 @@ class AccesoRepository:
                 "EmpleadoID": acceso.EmpleadoID,
                 "NombreEmpleado": f"{nombre_empleado or 'N/A'} {apellido or ''}".strip() or "Desconocido",
                 "DNI": dni or "N/A",
-                "Rol": rol.value if hasattr(rol, 'value') else str(rol) if rol else "N/A",
+                "Rol": rol or "N/A",
                 "AreaID": acceso.AreaID,
                 "NombreArea": nombre_area or "N/A",
-                "TipoAcceso": acceso.TipoAcceso.value if hasattr(acceso.TipoAcceso, 'value') else str(acceso.TipoAcceso),
-                "MetodoAcceso": acceso.MetodoAcceso.value if hasattr(acceso.MetodoAcceso, 'value') else str(acceso.MetodoAcceso),
+                "TipoAcceso": acceso.TipoAcceso,
+                "MetodoAcceso": acceso.MetodoAcceso,
                 "DispositivoAcceso": acceso.DispositivoAcceso,
                 "ConfianzaReconocimiento": acceso.ConfianzaReconocimiento,
                 "AccesoPermitido": acceso.AccesoPermitido,
@@ -485,7 +567,7 @@ class AccesoRepository:
             }
             accesos.append(acceso_dict)
             
-        return accesos, total
+        return accesos, total, next_key
     
     def create(self, acceso_data: Dict[str, Any]) -> Acceso:
         """Create a new access record.
@@ -549,21 +631,32 @@ class AccesoRepository:
         
         return self.create(acceso_data)
     
-    def delete_by_empleado_id(self, empleado_id: int) -> int:
+    def delete_by_empleado_id(self, empleado_id: int, commit: bool = True) -> int:
         """Delete all access records for an employee.
         
+        Issued as a single DELETE statement; access rows already loaded in the
+        session are not synchronized.
+        
         Args:
             empleado_id: ID of the employee
+            commit: If False, leave the transaction open for the caller to commit;
+                errors are then raised instead of returning 0
             
         Returns:
             Number of records deleted
         """
         try:
-            count = self.session.query(Acceso).filter_by(EmpleadoID=empleado_id).delete()
-            self.session.commit()
-            return count
+            result = self.session.execute(
+                delete(Acceso).where(Acceso.EmpleadoID == empleado_id),
+                execution_options={"synchronize_session": False}
+            )
+            if commit:
+                self.session.commit()
+            return result.rowcount
         except Exception:
             self.session.rollback()
+            if not commit:
+                raise
             return 0
     
     def get_estadisticas_acceso(
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from databases import Database
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -11,7 +13,8 @@ from api.accesos import router as accesos_router
 
 load_dotenv()
 
-app = FastAPI()
+# orjson serializa las respuestas (listas de empleados/accesos) mucho más rápido que json
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Configurar CORS
 app.add_middleware(
@@ -22,13 +25,18 @@ app.add_middleware(
     allow_headers=["*"],             # Permite todos los headers
 )
 
-# Middleware de debug para registrar el origen de las peticiones
-@app.middleware("http")
-async def log_request(request: Request, call_next):
-    origin = request.headers.get("origin")
-    print(f"[DEBUG] Request Origin: {origin} - {request.method} {request.url}")
-    response = await call_next(request)
-    return response
+# Middleware de debug para registrar el origen de las peticiones.
+# Solo se registra con DEBUG=1 para no pagar el logging en cada petición en producción.
+if os.getenv("DEBUG", "").lower() in ("1", "true"):
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+
+    @app.middleware("http")
+    async def log_request(request: Request, call_next):
+        origin = request.headers.get("origin")
+        logger.debug("Request Origin: %s - %s %s", origin, request.method, request.url)
+        response = await call_next(request)
+        return response
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -59,4 +67,4 @@ app.include_router(accesos_router)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, access_log=False, log_level="warning")
\ No newline at end of file
@@ -1,14 +1,28 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, Float, Enum, ForeignKey, false
+    Column, Integer, String, Text, Float, Enum, ForeignKey, Index, DateTime, LargeBinary, false, func
 )
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import declarative_base, relationship
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, validator
+from typing import Optional, Union
+from datetime import date, datetime, time
 from models.enums import RolEnum, EstadoEmpleadoEnum, TipoAccesoEnum, MetodoAccesoEnum
 
 # Declaramos base para modelos SQLAlchemy
 Base = declarative_base()
 
+class EnumValue(TypeDecorator):
+    """Enum de SQLAlchemy que al leer devuelve el valor (str) en lugar del miembro.
+
+    Las respuestas usan siempre el texto del enum; convirtiéndolo al cargar la
+    fila los servicios no tienen que revisar el tipo en cada campo.
+    """
+    impl = Enum
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return value.value if value is not None else None
+
 # Modelo Area
 class Area(Base):
     __tablename__ = "areas"
@@ -31,19 +45,25 @@ class Empleado(Base):
     DNI = Column(String, unique=True, nullable=False)
     FechaNacimiento = Column(String, nullable=False)
     Email = Column(String, unique=True, nullable=False)
-    Rol = Column(Enum(RolEnum), nullable=False)
-    EstadoEmpleado = Column(Enum(EstadoEmpleadoEnum), nullable=False)
+    Rol = Column(EnumValue(RolEnum), nullable=False)
+    EstadoEmpleado = Column(EnumValue(EstadoEmpleadoEnum), nullable=False)
     AreaID = Column(String, ForeignKey("areas.AreaID"), nullable=False)
-    PIN = Column(String, nullable=True)  # PIN de acceso (opcional)
+    PIN = Column(String, nullable=True)  # PIN en texto plano (legacy, ver scripts/hash_pins.py)
+    PINHash = Column(String(32), nullable=True)  # Hash BLAKE2b con clave del PIN de acceso (opcional)
     DatosBiometricos = Column(Text, nullable=True)  # JSON string con encoding facial (legacy)
-    vector_cifrado = Column(Text, nullable=True)  # Encrypted facial vector
-    iv = Column(Text, nullable=True)  # Initialization vector for decryption
+    vector_cifrado = Column(LargeBinary, nullable=True)  # Encrypted facial vector (raw bytes)
+    iv = Column(LargeBinary, nullable=True)  # Initialization vector for decryption (raw bytes)
     estado = Column(String, default='activo', nullable=False)  # 'activo' or 'inactivo'
-    FechaRegistro = Column(String, nullable=False)
+    FechaRegistro = Column(DateTime(timezone=True), nullable=False, server_default=func.now())  # Lo asigna la base al insertar
 
     # Relación con área
     area = relationship("Area", back_populates="empleados")
 
+    __table_args__ = (
+        # Búsqueda de acceso por PIN (solo empleados con PIN asignado)
+        Index("ix_empleados_pinhash_area", "PINHash", "AreaID", postgresql_where=PINHash.isnot(None)),
+    )
+
 # Modelos Pydantic para solicitudes (creación de empleados)
 class EmpleadoCreate(BaseModel):
     Nombre: str
@@ -65,13 +85,36 @@ class Acceso(Base):
     AccesoID = Column(Integer, primary_key=True, index=True, autoincrement=True)
     EmpleadoID = Column(Integer, ForeignKey("empleados.EmpleadoID"), nullable=True)  # Puede ser NULL si acceso denegado
     AreaID = Column(String, ForeignKey("areas.AreaID"), nullable=False)
-    FechaHora = Column(String, nullable=False)
-    TipoAcceso = Column(Enum(TipoAccesoEnum), nullable=False)
-    MetodoAcceso = Column(Enum(MetodoAccesoEnum), nullable=False)
+    FechaHora = Column(DateTime(timezone=True), nullable=False)
+    TipoAcceso = Column(EnumValue(TipoAccesoEnum), nullable=False)
+    MetodoAcceso = Column(EnumValue(MetodoAccesoEnum), nullable=False)
     DispositivoAcceso = Column(String, nullable=False)
     ConfianzaReconocimiento = Column(Float, nullable=True)
     AccesoPermitido = Column(String, nullable=False)  # "Permitido" o "Denegado"
 
+    # Índices para los filtros de /accesos, que siempre ordenan por FechaHora
+    __table_args__ = (
+        Index("ix_accesos_empleado_fecha", "EmpleadoID", "FechaHora"),
+        Index("ix_accesos_area_fecha", "AreaID", "FechaHora"),
+        Index("ix_accesos_fecha", "FechaHora"),
+    )
+
+# Filtros de GET /accesos, validados y convertidos por FastAPI al recibir la petición
+class AccesoQuery(BaseModel):
+    empleado_id: Optional[int] = None
+    area_id: Optional[str] = None
+    tipo_acceso: Optional[str] = None
+    # Se acepta YYYY-MM-DD o fecha y hora ISO 8601
+    fecha_inicio: Optional[Union[datetime, date]] = None
+    fecha_fin: Optional[Union[datetime, date]] = None
+
+    @validator("fecha_inicio", "fecha_fin")
+    def fecha_a_datetime(cls, valor):
+        # Una fecha sin hora se interpreta desde las 00:00
+        if valor is not None and not isinstance(valor, datetime):
+            return datetime.combine(valor, time())
+        return valor
+
 # Modelos Pydantic para respuestas (sin información sensible)
 class EmpleadoResponse(BaseModel):
     EmpleadoID: int
@@ -85,15 +128,17 @@ class EmpleadoResponse(BaseModel):
     AreaID: str
     AreaNombre: Optional[str] = None
     TieneBiometricos: bool = False
-    FechaRegistro: str
+    FechaRegistro: datetime
 
 class PaginationMetadata(BaseModel):
-    total: int
-    page: int
+    # total, page y total_pages son None en las páginas pedidas con cursor
+    total: Optional[int]
+    page: Optional[int]
     page_size: int
-    total_pages: int
+    total_pages: Optional[int]
     has_previous: bool
     has_next: bool
+    next_cursor: Optional[str] = None
 
 class PaginatedResponse(BaseModel):
     items: list
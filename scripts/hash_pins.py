@@ -0,0 +1,44 @@
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Local imports
+from database.connection import SessionLocal, engine
+from models.database import Empleado
+from scripts.migrate_schema import crear_indices
+from utils.crypto_utils import hash_pin
+
+def agregar_columna_pin_hash():
+    """Add the PINHash column to databases created before PINs were hashed."""
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE empleados ADD COLUMN IF NOT EXISTS "PINHash" VARCHAR(32)'))
+
+def migrar_pines():
+    """Hash every plain-text PIN into PINHash and clear the legacy PIN column.
+
+    Only EmpleadoID and PIN are read, so rows whose vector_cifrado / iv are
+    still base64 text (before scripts.migrate_schema) are never loaded as binary.
+    """
+    session = SessionLocal()
+    try:
+        filas = session.query(Empleado.EmpleadoID, Empleado.PIN).filter(Empleado.PIN.isnot(None)).all()
+        session.bulk_update_mappings(Empleado, [
+            {"EmpleadoID": empleado_id, "PINHash": hash_pin(pin), "PIN": None}
+            for empleado_id, pin in filas
+        ])
+        session.commit()
+        print(f"PINs migrados: {len(filas)}")
+    except Exception as e:
+        session.rollback()
+        print(f"Error migrando PINs: {str(e)}")
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    agregar_columna_pin_hash()
+    migrar_pines()
+    # The (PINHash, AreaID) index is skipped by migrate_schema while the column is missing
+    crear_indices()
@@ -0,0 +1,124 @@
+import base64
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.types import DateTime, LargeBinary
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Local imports
+from database.connection import engine
+from models.database import Base
+
+# Columns stored as ISO strings before they were migrated to TIMESTAMPTZ: (table, column)
+COLUMNAS_FECHA = [
+    ("empleados", "FechaRegistro"),
+    ("accesos", "FechaHora"),
+]
+
+def migrar_fechas():
+    """Convert the ISO-string timestamp columns of existing databases to TIMESTAMPTZ."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for tabla, columna in COLUMNAS_FECHA:
+            tipo = next(c["type"] for c in inspector.get_columns(tabla) if c["name"] == columna)
+            if isinstance(tipo, DateTime):
+                continue
+            conn.execute(text(
+                f'ALTER TABLE {tabla} ALTER COLUMN "{columna}" TYPE TIMESTAMPTZ USING "{columna}"::timestamptz'
+            ))
+            print(f"Columna {tabla}.{columna} migrada a TIMESTAMPTZ")
+
+# Columns that held base64 text before facial vectors were stored as raw bytes
+COLUMNAS_BINARIAS = ["vector_cifrado", "iv"]
+
+def _texto_a_bytes(valor):
+    """Decode a legacy text value: base64, or the "b'...'" repr some old rows were written with."""
+    if valor is None:
+        return None
+    if valor.startswith("b'") and valor.endswith("'"):
+        return valor[2:-1].encode('latin-1')
+    return base64.b64decode(valor)
+
+def migrar_vectores_binarios():
+    """Convert the base64 text facial-vector columns of existing databases to BYTEA.
+
+    Rows are decoded in Python (some legacy IVs are not plain base64) and
+    written back after the type change, all in one transaction.
+    """
+    inspector = inspect(engine)
+    tipos = {c["name"]: c["type"] for c in inspector.get_columns("empleados")}
+    pendientes = [c for c in COLUMNAS_BINARIAS if not isinstance(tipos[c], LargeBinary)]
+    if not pendientes:
+        return
+
+    with engine.begin() as conn:
+        columnas = ", ".join(f'"{c}"' for c in pendientes)
+        filas = conn.execute(text(
+            f'SELECT "EmpleadoID", {columnas} FROM empleados WHERE ' +
+            " OR ".join(f'"{c}" IS NOT NULL' for c in pendientes)
+        )).fetchall()
+
+        for columna in pendientes:
+            conn.execute(text(f'ALTER TABLE empleados ALTER COLUMN "{columna}" TYPE BYTEA USING NULL'))
+
+        actualizar = text(
+            "UPDATE empleados SET " +
+            ", ".join(f'"{c}" = :{c}' for c in pendientes) +
+            ' WHERE "EmpleadoID" = :empleado_id'
+        ).bindparams(*[bindparam(c, type_=LargeBinary) for c in pendientes])
+        if filas:
+            conn.execute(actualizar, [
+                {"empleado_id": fila[0], **{c: _texto_a_bytes(v) for c, v in zip(pendientes, fila[1:])}}
+                for fila in filas
+            ])
+        print(f"Columnas {', '.join(pendientes)} migradas a BYTEA ({len(filas)} empleados)")
+
+def crear_indices():
+    """Create the indexes declared on the models that existing databases are missing.
+
+    Base.metadata.create_all only creates indexes together with new tables, so
+    indexes added to tables that already existed have to be created here.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {indice["name"] for indice in inspector.get_indexes(tabla.name)}
+            columnas = {columna["name"] for columna in inspector.get_columns(tabla.name)}
+            for indice in tabla.indexes:
+                if indice.name in existentes:
+                    continue
+                faltantes = [c.name for c in indice.columns if c.name not in columnas]
+                if faltantes:
+                    print(f"Índice {indice.name} omitido: faltan las columnas {', '.join(faltantes)}")
+                    continue
+                indice.create(bind=conn)
+                print(f"Índice {indice.name} creado en {tabla.name}")
+
+def agregar_defaults():
+    """Add the server-side defaults declared on the models to existing columns.
+
+    Like indexes, column defaults are only created together with new tables.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            actuales = {columna["name"]: columna.get("default") for columna in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.server_default is None or columna.name not in actuales or actuales[columna.name]:
+                    continue
+                valor = columna.server_default.arg
+                if not isinstance(valor, str):
+                    valor = str(valor.compile(dialect=engine.dialect))
+                conn.execute(text(f'ALTER TABLE {tabla.name} ALTER COLUMN "{columna.name}" SET DEFAULT {valor}'))
+                print(f"Valor por defecto de {tabla.name}.{columna.name}: {valor}")
+
+if __name__ == "__main__":
+    migrar_fechas()
+    migrar_vectores_binarios()
+    crear_indices()
+    agregar_defaults()
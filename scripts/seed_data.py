@@ -1,11 +1,13 @@
 import os
 import random
-import base64
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from faker import Faker
-from typing import List, Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Tuple, Iterable, Iterator
 from dotenv import load_dotenv
+from sqlalchemy import insert
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,74 +15,111 @@ load_dotenv()
 # Local imports
 from database.connection import SessionLocal 
 from models.database import Empleado, RolEnum, EstadoEmpleadoEnum, Acceso, TipoAccesoEnum, MetodoAccesoEnum, Area
-from utils.crypto_utils import VectorEncryption
+from utils.crypto_utils import VectorEncryption, hash_pin
+
+# Employees created by cargar_empleados_iniciales (SEED_EMPLOYEES in the environment)
+NUM_EMPLOYEES = int(os.getenv("SEED_EMPLOYEES", "200"))
+
+# Employees generated, encrypted and inserted per executemany
+EMPLOYEE_CHUNK_SIZE = 500
+
+# Above this many employees, vector encryption is spread across processes
+PARALLEL_ENCRYPTION_THRESHOLD = 1000
+
+# VectorEncryption of each worker process (created on first use)
+_worker_crypto = None
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield successive lists of up to `size` items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _encrypt_rows(rows: np.ndarray) -> List[Tuple[bytes, bytes]]:
+    """Encrypt a block of vectors inside a worker process."""
+    global _worker_crypto
+    if _worker_crypto is None:
+        _worker_crypto = VectorEncryption()
+    return _worker_crypto.encrypt_vectors_batch(rows)
+
+def encrypt_vectors(crypto: VectorEncryption, vectors: np.ndarray,
+                    pool: ProcessPoolExecutor = None) -> List[Tuple[bytes, bytes]]:
+    """Encrypt vectors in this process, or split across the pool's workers if one is given."""
+    if pool is None:
+        return crypto.encrypt_vectors_batch(vectors)
+    blocks = np.array_split(vectors, os.cpu_count() or 1)
+    return [result for block in pool.map(_encrypt_rows, blocks) for result in block]
 
 def cargar_areas_ejemplo():
     session = SessionLocal()
     try:
         # Crear áreas de ejemplo basadas en la imagen
         areas = [
-            Area(
-                AreaID="AREA001",
-                Nombre="Preparacion",
-                Descripcion="Control de materia prima entrante",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA002",
-                Nombre="Procesamiento",
-                Descripcion="Procesamiento inicial de alimentos",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA003",
-                Nombre="Elaboración",
-                Descripcion="Elaboración de productos terminados",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA004",
-                Nombre="Envasado",
-                Descripcion="Envasado y empaquetado final",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA005",
-                Nombre="Etiquetado",
-                Descripcion="Etiquetado",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA006",
-                Nombre="Control Calidad",
-                Descripcion="Control de calidad y laboratorio",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA007",
-                Nombre="Administración",
-                Descripcion="Área administrativa y gerencia",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA008",
-                Nombre="Comun",
-                Descripcion="Espacios comunes",
-                Estado="Activo"
-            ),
-            Area(
-                AreaID="AREA009",
-                Nombre="Logistica",
-                Descripcion="Gestion de almacenamiento y distribucion de insumos y productos terminados",
-                Estado="Activo"
-            )
+            {
+                'AreaID': "AREA001",
+                'Nombre': "Preparacion",
+                'Descripcion': "Control de materia prima entrante",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA002",
+                'Nombre': "Procesamiento",
+                'Descripcion': "Procesamiento inicial de alimentos",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA003",
+                'Nombre': "Elaboración",
+                'Descripcion': "Elaboración de productos terminados",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA004",
+                'Nombre': "Envasado",
+                'Descripcion': "Envasado y empaquetado final",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA005",
+                'Nombre': "Etiquetado",
+                'Descripcion': "Etiquetado",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA006",
+                'Nombre': "Control Calidad",
+                'Descripcion': "Control de calidad y laboratorio",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA007",
+                'Nombre': "Administración",
+                'Descripcion': "Área administrativa y gerencia",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA008",
+                'Nombre': "Comun",
+                'Descripcion': "Espacios comunes",
+                'Estado': "Activo"
+            },
+            {
+                'AreaID': "AREA009",
+                'Nombre': "Logistica",
+                'Descripcion': "Gestion de almacenamiento y distribucion de insumos y productos terminados",
+                'Estado': "Activo"
+            }
         ]
         
-        # Insertar áreas si no existen
-        for area in areas:
-            existe = session.query(Area).filter_by(AreaID=area.AreaID).first()
-            if not existe:
-                session.add(area)
+        # Insertar las áreas que no existen: una consulta de los IDs existentes y un
+        # único INSERT (executemany de Core, como empleados y accesos)
+        existentes = {area_id for (area_id,) in session.query(Area.AreaID)}
+        nuevas = [area for area in areas if area['AreaID'] not in existentes]
+        if nuevas:
+            session.execute(insert(Area), nuevas)
         session.commit()
         print("Áreas de ejemplo cargadas correctamente.")
     except Exception as e:
@@ -89,26 +128,25 @@ def cargar_areas_ejemplo():
     finally:
         session.close()
 
-def generate_realistic_vectors(num_vectors: int, dimensions: int = 128) -> List[List[float]]:
+def generate_realistic_vectors(num_vectors: int, dimensions: int = 128, seed: int = None) -> np.ndarray:
     """Generate realistic facial vectors with some patterns."""
+    rng = np.random.default_rng(seed)
+    
     # Create some clusters to simulate family resemblances
     clusters = 15
-    cluster_centers = [np.random.normal(0, 0.5, dimensions) for _ in range(clusters)]
+    cluster_centers = rng.normal(0, 0.5, (clusters, dimensions))
     
-    vectors = []
-    for _ in range(num_vectors):
-        # Choose a random cluster
-        center = random.choice(cluster_centers)
-        # Add some noise to create variation
-        vector = center + np.random.normal(0, 0.1, dimensions)
-        # Normalize to unit vector
-        vector = vector / np.linalg.norm(vector)
-        vectors.append(vector.tolist())
+    # Pick a random cluster for every vector and add some noise to create variation
+    vectors = cluster_centers[rng.integers(0, clusters, num_vectors)]
+    vectors += rng.normal(0, 0.1, (num_vectors, dimensions))
+    # Normalize every row to a unit vector
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
     
     return vectors
 
-def generate_employee_data(num_employees: int = 200) -> List[Dict]:
-    """Generate realistic employee data with distribution across areas."""
+def generate_employee_data(num_employees: int = 200, seed: int = None) -> Iterator[Dict]:
+    """Generate realistic employee data with distribution across areas, one employee at a time."""
+    rng = np.random.default_rng(seed)
     fake = Faker('es_ES')
     Faker.seed(42)  # For reproducibility
     
@@ -125,45 +163,47 @@ def generate_employee_data(num_employees: int = 200) -> List[Dict]:
         ("AREA009", 0.04)   # Logistica
     ]
     
-    # Calculate exact number of employees per area
-    area_assignments = []
-    remaining_employees = num_employees
+    # Calculate exact number of employees per area; the last area takes the
+    # remainder so the total is exactly num_employees
+    area_ids = [area_id for area_id, _ in area_distribution]
+    counts = np.rint(np.array([pct for _, pct in area_distribution[:-1]]) * num_employees).astype(int)
+    counts = np.append(counts, num_employees - counts.sum())
     
-    # Assign exact counts for all areas except the last one
-    for i, (area_id, percentage) in enumerate(area_distribution[:-1]):
-        count = int(round(percentage * num_employees))
-        area_assignments.extend([area_id] * count)
-        remaining_employees -= count
+    # Area of each employee as an index into area_ids, in random order
+    area_idx = rng.permutation(np.repeat(np.arange(len(area_ids)), counts))
     
-    # Assign remaining employees to the last area to ensure total is exactly 200
-    last_area_id = area_distribution[-1][0]
-    area_assignments.extend([last_area_id] * remaining_employees)
+    # Role distribution (more operarios than supervisors) and employee states,
+    # drawn for every employee at once as indices into these lists
+    roles = [RolEnum.Operario, RolEnum.Supervisor]
+    estados_empleado = [EstadoEmpleadoEnum.Activo, EstadoEmpleadoEnum.Inactivo]
+    rol_idx = rng.choice(len(roles), size=num_employees, p=[0.8, 0.2])
+    estado_empleado_idx = rng.choice(len(estados_empleado), size=num_employees, p=[0.9, 0.1])  # 90% active, 10% inactive
+    activos = rng.random(num_employees) < 0.9
+    pins = rng.integers(1000, 10000, size=num_employees)
+    dias_registro = rng.integers(1, 366, size=num_employees)
+    now = datetime.now(timezone.utc)
     
-    # Shuffle the assignments to randomize the order
-    random.shuffle(area_assignments)
+    # Draw all unique DNIs at once (sampling without replacement)
+    dnis = (rng.choice(30000001, size=num_employees, replace=False) + 20000000).astype(str)
     
-    # Generate role distribution (more operarios than supervisors)
-    roles = [RolEnum.Operario] * 8 + [RolEnum.Supervisor] * 2
+    # Names and dates of birth (18-65 years old), generated before the loop
+    # with the Faker provider methods bound once
+    _first_name, _last_name, _date_of_birth = fake.first_name, fake.last_name, fake.date_of_birth
+    first_names = [_first_name() for _ in range(num_employees)]
+    last_names = [_last_name() for _ in range(num_employees)]
+    birth_dates = [_date_of_birth(minimum_age=18, maximum_age=65) for _ in range(num_employees)]
     
     # Generate employee data
-    employees = []
-    used_dnis = set()
-    
+    emails = set()
     for i in range(num_employees):
-        # Generate unique DNI
-        while True:
-            dni = str(random.randint(20000000, 50000000))
-            if dni not in used_dnis:
-                used_dnis.add(dni)
-                break
+        dni = str(dnis[i])
         
-        # Generate name and email
-        first_name = fake.first_name()
-        last_name = fake.last_name()
+        first_name, last_name = first_names[i], last_names[i]
         email = f"{first_name.lower()}.{last_name.lower()}@empresa.com"
-        
-        # Random date of birth (18-65 years old)
-        birth_date = fake.date_of_birth(minimum_age=18, maximum_age=65)
+        if email in emails:
+            # Repeated names are common in large seeds; the DNI keeps the email unique
+            email = f"{first_name.lower()}.{last_name.lower()}.{dni}@empresa.com"
+        emails.add(email)
         
         # Create employee data
         employee = {
@@ -171,22 +211,17 @@ def generate_employee_data(num_employees: int = 200) -> List[Dict]:
             'Apellido': last_name,
             'DNI': dni,
             'Email': email,
-            'FechaNacimiento': birth_date.isoformat(),
-            'Rol': random.choice(roles),
-            'EstadoEmpleado': random.choices(
-                [EstadoEmpleadoEnum.Activo, EstadoEmpleadoEnum.Inactivo],
-                weights=[0.9, 0.1]  # 90% active, 10% inactive
-            )[0],
-            'AreaID': area_assignments[i],
-            'PIN': str(random.randint(1000, 9999)),
-            'estado': 'activo' if random.random() < 0.9 else 'inactivo',
-            'FechaRegistro': (datetime.now() - timedelta(days=random.randint(1, 365))).isoformat()
+            'FechaNacimiento': birth_dates[i].isoformat(),
+            'Rol': roles[rol_idx[i]],
+            'EstadoEmpleado': estados_empleado[estado_empleado_idx[i]],
+            'AreaID': area_ids[area_idx[i]],
+            'PINHash': hash_pin(str(pins[i])),
+            'estado': 'activo' if activos[i] else 'inactivo',
+            'FechaRegistro': now - timedelta(days=int(dias_registro[i]))
         }
-        employees.append(employee)
-    
-    return employees
+        yield employee
 
-def cargar_empleados_iniciales():
+def cargar_empleados_iniciales(num_employees: int = NUM_EMPLOYEES):
     """Load initial employees with encrypted facial vectors."""
     # Debug: Print environment variables
     print("\nDebug - Environment Variables:")
@@ -198,14 +233,15 @@ def cargar_empleados_iniciales():
         print(f"Key value (first 10 chars): {key[:10]}...")
     
     session = SessionLocal()
+    pool = None
     try:
         # Check if employees already exist
         if session.query(Empleado).count() > 0:
             print("Employees already exist in the database. Skipping employee creation.")
             return
 
-        print("\nGenerating employee data...")
-        employees_data = generate_employee_data(200)  # Generate 200 employees
+        print(f"\nGenerating data for {num_employees} employees...")
+        employees_data = generate_employee_data(num_employees)  # Generated lazily, chunk by chunk
 
         # Initialize encryption
         print("\nInitializing encryption...")
@@ -214,40 +250,35 @@ def cargar_empleados_iniciales():
         
         # Generate realistic facial vectors
         print("Generating facial vectors...")
-        vectors = generate_realistic_vectors(len(employees_data))
+        vectors = generate_realistic_vectors(num_employees)
         
         print("Encrypting vectors and creating employee records...")
-        for i, (emp_data, vector) in enumerate(zip(employees_data, vectors)):
-            # Encrypt the facial vector
-            encrypted_data, iv = crypto.encrypt_vector(vector)
-            
-            # Convert binary data to base64 for storage in Text field
-            encrypted_b64 = base64.b64encode(encrypted_data).decode('utf-8')
-            iv_b64 = base64.b64encode(iv).decode('utf-8')
-            
-            # Create employee with encrypted vector
-            employee = Empleado(
-                **{k: v for k, v in emp_data.items() if k != 'estado'},
-                vector_cifrado=encrypted_b64,
-                iv=iv_b64,
-                estado=emp_data['estado']
-            )
+        if num_employees > PARALLEL_ENCRYPTION_THRESHOLD:
+            pool = ProcessPoolExecutor()
+        created = 0
+        for chunk in chunked(employees_data, EMPLOYEE_CHUNK_SIZE):
+            encrypted_vectors = encrypt_vectors(crypto, vectors[created:created + len(chunk)], pool)
             
-            session.add(employee)
+            # Raw bytes go straight into the binary vector_cifrado / iv columns
+            mappings = [
+                {**emp_data, 'vector_cifrado': encrypted_data, 'iv': iv}
+                for emp_data, (encrypted_data, iv) in zip(chunk, encrypted_vectors)
+            ]
             
-            # Commit in batches of 50
-            if i % 50 == 0 and i > 0:
-                session.commit()
-                print(f"Processed {i} employees...")
+            # One Core executemany per chunk (multi-row VALUES pages)
+            session.execute(insert(Empleado), mappings)
+            created += len(chunk)
         
         session.commit()
-        print(f"Successfully created {len(employees_data)} employees with encrypted facial vectors.")
+        print(f"Successfully created {created} employees with encrypted facial vectors.")
         
     except Exception as e:
         session.rollback()
         print(f"Error creating employees: {str(e)}")
         raise
     finally:
+        if pool is not None:
+            pool.shutdown()
         session.close()
 
 def cargar_accesos_ejemplo():
@@ -270,14 +301,23 @@ def cargar_accesos_ejemplo():
             print("No active employees found. Please run employee creation first.")
             return
         
+        # All area IDs, fetched once for the "wrong area" denied accesses
+        all_area_ids = [area_id for (area_id,) in session.query(Area.AreaID)]
+        
+        # Enum members, listed once for every row
+        tipos_acceso = list(TipoAccesoEnum)
+        metodos_acceso = list(MetodoAccesoEnum)
+        now = datetime.now(timezone.utc)
+        
         # Create only 10 access records in total
         total_logs = 10
         
+        rows = []
         for _ in range(total_logs):
             # Select a random employee for each log
             empleado = random.choice(empleados)
             # Random date in the last 90 days
-            fecha_hora = datetime.now() - timedelta(
+            fecha_hora = now - timedelta(
                 days=random.randint(0, 90),
                 hours=random.randint(0, 23),
                 minutes=random.randint(0, 59)
@@ -292,31 +332,25 @@ def cargar_accesos_ejemplo():
             # For denied access, 50% chance it's because of wrong area
             if acceso_permitido == "Denegado" and random.random() < 0.5:
                 # Get a random area that's not the employee's area
-                areas = session.query(Area.AreaID).filter(Area.AreaID != empleado.AreaID).all()
-                if areas:
-                    area_id = random.choice(areas)[0]
-                else:
-                    area_id = empleado.AreaID
+                other_areas = [area_id for area_id in all_area_ids if area_id != empleado.AreaID]
+                area_id = random.choice(other_areas) if other_areas else empleado.AreaID
             else:
                 area_id = empleado.AreaID
             
             # Create access log
-            acceso = Acceso(
-                EmpleadoID=empleado.EmpleadoID if acceso_permitido == "Permitido" else None,
-                AreaID=area_id,
-                FechaHora=fecha_hora.isoformat(),
-                TipoAcceso=random.choice(list(TipoAccesoEnum)),
-                MetodoAcceso=random.choice(list(MetodoAccesoEnum)),
-                DispositivoAcceso=f"Dispositivo-{random.randint(1, 10)}",
-                ConfianzaReconocimiento=random.uniform(0.7, 1.0) if acceso_permitido == "Permitido" else random.uniform(0.1, 0.6),
-                AccesoPermitido=acceso_permitido
-            )
-            session.add(acceso)
-            
-            # Occasionally commit to avoid large transactions
-            if random.random() < 0.1:  # 10% chance to commit
-                session.commit()
+            rows.append({
+                'EmpleadoID': empleado.EmpleadoID if acceso_permitido == "Permitido" else None,
+                'AreaID': area_id,
+                'FechaHora': fecha_hora,
+                'TipoAcceso': random.choice(tipos_acceso),
+                'MetodoAcceso': random.choice(metodos_acceso),
+                'DispositivoAcceso': f"Dispositivo-{random.randint(1, 10)}",
+                'ConfianzaReconocimiento': random.uniform(0.7, 1.0) if acceso_permitido == "Permitido" else random.uniform(0.1, 0.6),
+                'AccesoPermitido': acceso_permitido
+            })
     
+        # All access logs go in one Core executemany and one transaction
+        session.execute(insert(Acceso), rows)
         session.commit()
         print("Successfully generated 10 access logs.")
         
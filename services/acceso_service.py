@@ -1,76 +1,103 @@
-from database.connection import SessionLocal
+from sqlalchemy.orm import Session
 from database.repositories import AccesoRepository, EmpleadoRepository
+from services import biometric_cache
 from services.face_recognition_service import FaceRecognitionService
 from models.enums import TipoAccesoEnum
-from datetime import datetime, timezone
+from utils.crypto_utils import hash_pin
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
 
+# El servicio de reconocimiento no tiene estado por petición; se comparte
+face_service = FaceRecognitionService(threshold=0.6)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _encode_cursor(fecha_hora: datetime, acceso_id: int) -> str:
+    """Cursor de la página siguiente: "<FechaHora en µs desde epoch>_<AccesoID>" del último acceso"""
+    if fecha_hora.tzinfo is None:
+        # Fechas sin zona horaria (SQLite): se guardan en UTC
+        fecha_hora = fecha_hora.replace(tzinfo=timezone.utc)
+    microsegundos = (fecha_hora - _EPOCH) // timedelta(microseconds=1)
+    return f"{microsegundos}_{acceso_id}"
+
+def _decode_cursor(cursor: str):
+    """Convierte un cursor de _encode_cursor en la clave (FechaHora, AccesoID)"""
+    try:
+        microsegundos, acceso_id = cursor.split("_")
+        return _EPOCH + timedelta(microseconds=int(microsegundos)), int(acceso_id)
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
 class AccesoService:
-    def __init__(self):
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.acceso_repo = AccesoRepository(self.session)
         self.empleado_repo = EmpleadoRepository(self.session)
-        self.face_service = FaceRecognitionService(threshold=0.6)
+        self.face_service = face_service
     
     def get_all_accesos(self, empleado_id=None, area_id=None, tipo_acceso=None, 
                        fecha_inicio=None, fecha_fin=None, limit=10, offset=0, 
-                       page=1, page_size=10):
+                       page=1, page_size=10, cursor=None):
         """Obtiene todos los accesos con filtros y paginación
         
         Args:
             empleado_id: Filtrar por ID de empleado
             area_id: Filtrar por ID de área
             tipo_acceso: Filtrar por tipo de acceso
-            fecha_inicio: Filtrar desde esta fecha
-            fecha_fin: Filtrar hasta esta fecha
+            fecha_inicio: Filtrar desde esta fecha (datetime)
+            fecha_fin: Filtrar hasta esta fecha (datetime)
             limit: Número máximo de registros a devolver
             offset: Número de registros a omitir
             page: Número de página actual (comienza en 1)
             page_size: Tamaño de la página
+            cursor: Valor de pagination.next_cursor de la página anterior (paginación
+                por cursor); se ignoran page y offset y no se cuenta el total
             
         Returns:
             Dict con la lista de accesos y metadatos de paginación
         """
-        from datetime import datetime
-        
-        # Convert string dates to datetime objects
-        if isinstance(fecha_inicio, str):
-            try:
-                fecha_inicio = datetime.fromisoformat(fecha_inicio)
-            except (ValueError, TypeError):
-                fecha_inicio = None
-                
-        if isinstance(fecha_fin, str):
-            try:
-                fecha_fin = datetime.fromisoformat(fecha_fin)
-            except (ValueError, TypeError):
-                fecha_fin = None
-        
-        # Obtener accesos con paginación
-        accesos, total = self.acceso_repo.get_all_with_employee_info(
+        accesos, total, next_key = self.acceso_repo.get_all_with_employee_info(
             empleado_id=empleado_id,
             area_id=area_id,
             tipo_acceso=tipo_acceso,
             fecha_inicio=fecha_inicio,
             fecha_fin=fecha_fin,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=_decode_cursor(cursor) if cursor is not None else None,
+            with_total=cursor is None
         )
+        # next_key solo viene si hay página siguiente
+        hay_siguiente = next_key is not None
+        next_cursor = _encode_cursor(*next_key) if hay_siguiente else None
         
-        # Calcular metadatos de paginación
-        total_pages = (total + page_size - 1) // page_size if page_size > 0 else 1
-        
-        # Asegurar que la página actual sea válida
-        current_page = max(1, min(page, total_pages)) if total_pages > 0 else 1
-        
-        pagination = {
-            "total": total,
-            "page": current_page,
-            "page_size": page_size,
-            "total_pages": total_pages,
-            "has_previous": current_page > 1,
-            "has_next": current_page < total_pages
-        }
+        if cursor is not None:
+            # Con cursor no se conoce el número de página ni el total: solo si hay más
+            pagination = {
+                "total": None,
+                "page": None,
+                "page_size": page_size,
+                "total_pages": None,
+                "has_previous": True,
+                "has_next": hay_siguiente,
+                "next_cursor": next_cursor
+            }
+        else:
+            # Calcular metadatos de paginación
+            total_pages = (total + page_size - 1) // page_size if page_size > 0 else 1
+            
+            # Asegurar que la página actual sea válida
+            current_page = max(1, min(page, total_pages)) if total_pages > 0 else 1
+            
+            pagination = {
+                "total": total,
+                "page": current_page,
+                "page_size": page_size,
+                "total_pages": total_pages,
+                "has_previous": current_page > 1,
+                "has_next": current_page < total_pages,
+                "next_cursor": next_cursor
+            }
         
         return {
             "items": accesos,
@@ -87,39 +114,52 @@ class AccesoService:
             "EmpleadoID": acceso.EmpleadoID,
             "AreaID": acceso.AreaID,
             "FechaHora": acceso.FechaHora,
-            "TipoAcceso": acceso.TipoAcceso.value if hasattr(acceso.TipoAcceso, 'value') else str(acceso.TipoAcceso),
-            "MetodoAcceso": acceso.MetodoAcceso.value if hasattr(acceso.MetodoAcceso, 'value') else str(acceso.MetodoAcceso),
+            "TipoAcceso": acceso.TipoAcceso,
+            "MetodoAcceso": acceso.MetodoAcceso,
             "DispositivoAcceso": acceso.DispositivoAcceso,
             "ConfianzaReconocimiento": acceso.ConfianzaReconocimiento,
             "AccesoPermitido": acceso.AccesoPermitido
         }
     
-    def create_facial_access(self, image_bytes, tipo_acceso: TipoAccesoEnum, 
-                           area_id: str, dispositivo: str = "Dispositivo1"):
+    async def create_facial_access(self, image_bytes, tipo_acceso: TipoAccesoEnum, 
+                                   area_id: str, dispositivo: str = "Dispositivo1"):
         """Crea un acceso por reconocimiento facial"""
         try:
-            # Extraer encoding facial
-            face_encoding = self.face_service.extract_face_encoding(image_bytes)
+            # Extraer encoding facial fuera del event loop
+            face_encoding = await self.face_service.extract_face_encoding_async(image_bytes)
             
-            # Obtener empleados con datos biométricos
-            empleados = self.empleado_repo.get_with_biometric_data()
+            # Índice de encodings de los empleados del área con datos biométricos (cacheado,
+            # y recargado fuera del event loop cuando venció);
+            # empleados de otras áreas no se descifran ni se comparan
+            index = await biometric_cache.get_or_load_async(self.session, area_id)
             
             # Buscar coincidencia
-            mejor_empleado, confianza = self.face_service.compare_faces(face_encoding, empleados)
+            empleado_id, confianza = self.face_service.compare_faces(face_encoding, index)
+            mejor_empleado = self.empleado_repo.get_by_id(empleado_id) if empleado_id is not None else None
             
             if mejor_empleado is None:
                 raise HTTPException(status_code=403, detail="Empleado no reconocido")
             
-            # Verificar si el empleado pertenece al área
+            # Verificar si el empleado pertenece al área (el índice cacheado puede estar
+            # desactualizado si el empleado cambió de área desde otro worker)
             if mejor_empleado.AreaID != area_id:
                 raise HTTPException(
                     status_code=403, 
                     detail=f"Empleado {mejor_empleado.Nombre} {mejor_empleado.Apellido} no tiene acceso al área {area_id}"
                 )
             
+            # Verificar que el empleado esté activo, como en el acceso por PIN (el índice
+            # cacheado puede seguir incluyendo empleados desactivados desde otro worker;
+            # get_by_id ya descarta los dados de baja)
+            if mejor_empleado.EstadoEmpleado != "Activo":
+                raise HTTPException(
+                    status_code=403,
+                    detail="Empleado no está activo en el sistema"
+                )
+            
             # Crear registro de acceso
             # Usar UTC en lugar de la hora local
-            ahora = datetime.now(timezone.utc).isoformat()  # Genera la hora en UTC con offset +00:00
+            ahora = datetime.now(timezone.utc)  # Hora en UTC, se guarda como TIMESTAMPTZ
             acceso_data = {
                 "EmpleadoID": mejor_empleado.EmpleadoID,
                 "AreaID": area_id,
@@ -156,8 +196,8 @@ class AccesoService:
                          area_id: str, dispositivo: str = "Dispositivo1"):
         """Crea un acceso por PIN"""
         try:
-            # Buscar empleado por PIN y área
-            empleado = self.empleado_repo.get_by_pin_and_area(pin, area_id)
+            # Buscar empleado por hash del PIN y área
+            empleado = self.empleado_repo.get_by_pin_hash_and_area(hash_pin(pin), area_id)
             
             if not empleado:
                 raise HTTPException(
@@ -173,7 +213,7 @@ class AccesoService:
                 )
             
             # Crear registro de acceso
-            ahora = datetime.now(timezone.utc).isoformat()  # Usar UTC
+            ahora = datetime.now(timezone.utc)  # Usar UTC
             acceso_data = {
                 "EmpleadoID": empleado.EmpleadoID,
                 "AreaID": area_id,
@@ -205,6 +245,3 @@ class AccesoService:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
-    
-    def __del__(self):
-        self.session.close()
@@ -1,10 +1,10 @@
-from database.connection import SessionLocal
+from sqlalchemy.orm import Session
 from database.repositories import AreaRepository
 from fastapi import HTTPException
 
 class AreaService:
-    def __init__(self):
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.area_repo = AreaRepository(self.session)
     
     def get_all_areas(self):
@@ -28,6 +28,3 @@ class AreaService:
             "Descripcion": area.Descripcion,
             "Estado": area.Estado
         }
-    
-    def __del__(self):
-        self.session.close()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from database.repositories import EmpleadoRepository
+from services.encoding_index import EncodingIndex
+from utils.crypto_utils import get_vector_encryption
+
+logger = logging.getLogger(__name__)
+
+# Segundos que el índice puede reutilizarse sin volver a leer la base. Las
+# altas, bajas y cambios de empleados invalidan el caché en este proceso; el TTL
+# acota el tiempo en que otros workers pueden quedar desactualizados.
+BIOMETRIC_CACHE_TTL = float(os.getenv("BIOMETRIC_CACHE_TTL", "300"))
+
+# Dimensión de los encodings faciales de dlib
+ENCODING_DIMENSIONS = 128
+
+# Índices de encodings por área compartidos entre peticiones (cache-aside):
+# AreaID -> {"index", "cargado", "version"}
+_cache = {}
+
+# Cada área se recarga bajo su propio lock (AreaID -> Lock), así áreas distintas
+# se recargan en paralelo y una misma área una sola vez; _lock solo protege el
+# diccionario de locks.
+_area_locks = {}
+_lock = threading.Lock()
+
+# Versión de los datos de empleados; invalidate() la incrementa. Un índice
+# construido con una versión anterior se considera desactualizado.
+_version = 0
+_version_lock = threading.Lock()
+
+# Hilos para recargar índices (consulta y descifrado de todos los vectores del
+# área) fuera del event loop; con un lock por área, cada hilo puede recargar un
+# área distinta a la vez.
+_RELOAD_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="biometric-cache")
+
+def _vigente(entrada):
+    """Indica si una entrada del caché se puede usar sin recargarla"""
+    return (entrada is not None and entrada["version"] == _version
+            and time.monotonic() - entrada["cargado"] <= BIOMETRIC_CACHE_TTL)
+
+def _decrypt_encodings(filas):
+    """Descifra los encodings almacenados
+    
+    Args:
+        filas: Tuplas (EmpleadoID, vector_cifrado, iv)
+    
+    Returns:
+        Tupla (lista de EmpleadoID, matriz float32 de encodings) de los empleados
+        cuyos datos biométricos se pudieron descifrar
+    """
+    # Cada vector se escribe directo en una fila float32 de la matriz; los que no
+    # se pueden descifrar ya los registra decrypt_vectors_batch (por posición en el
+    # lote) y quedan fuera del índice. Acá solo se agregan los EmpleadoID.
+    encodings, descifrados = get_vector_encryption().decrypt_vectors_batch(
+        [(vector_cifrado, iv) for _, vector_cifrado, iv in filas], ENCODING_DIMENSIONS
+    )
+    ids = [filas[i][0] for i in descifrados]
+    if len(ids) < len(filas):
+        fallidos = sorted(set(fila[0] for fila in filas) - set(ids))
+        logger.warning("Empleados sin datos biométricos utilizables: %s", fallidos)
+    
+    return ids, encodings
+
+def _area_lock(area_id):
+    """Devuelve el lock de recarga del área, creándolo la primera vez"""
+    with _lock:
+        return _area_locks.setdefault(area_id, threading.Lock())
+
+def get_or_load(session, area_id):
+    """Devuelve el EncodingIndex de los empleados activos del área con datos biométricos
+    
+    Solo se consulta la base y se descifran los vectores cuando el caché fue
+    invalidado o venció su TTL; el resto de las peticiones reutilizan el índice.
+    
+    Args:
+        session: Sesión de base de datos
+        area_id: Área a la que se solicita el acceso; solo sus empleados son candidatos
+    
+    Returns:
+        EncodingIndex, o None si el área no tiene empleados con datos biométricos
+    """
+    with _area_lock(area_id):
+        entrada = _cache.get(area_id)
+        if not _vigente(entrada):
+            # Se toma la versión antes de leer: si hay una invalidación durante
+            # la carga, el índice queda con la versión vieja y se recarga luego
+            version = _version
+            filas = EmpleadoRepository(session).get_biometric_vectors(area_id=area_id)
+            ids, encodings = _decrypt_encodings(filas)
+            # El índice anterior se conserva para reutilizar sus centroides
+            anterior = entrada["index"] if entrada else None
+            entrada = {
+                "index": EncodingIndex(ids, encodings, previous=anterior) if ids else None,
+                "cargado": time.monotonic(),
+                "version": version
+            }
+            _cache[area_id] = entrada
+        return entrada["index"]
+
+async def get_or_load_async(session, area_id):
+    """Como get_or_load, pero si hay que recargar el índice lo hace en _RELOAD_POOL
+    
+    Con el índice vigente responde directo, sin pasar por otro hilo; la recarga
+    (consulta y descifrado de cada vector del área) no bloquea el event loop.
+    """
+    entrada = _cache.get(area_id)
+    if _vigente(entrada):
+        return entrada["index"]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_RELOAD_POOL, get_or_load, session, area_id)
+
+def invalidate():
+    """Marca los índices cacheados como desactualizados tras un cambio en los empleados
+    
+    No espera a que termine una recarga en curso: solo incrementa la versión.
+    """
+    global _version
+    with _version_lock:
+        _version += 1
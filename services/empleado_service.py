@@ -1,17 +1,17 @@
-import base64
-import json
-from typing import Optional, List, Dict, Any
+import orjson
+import numpy as np
+from typing import Optional, List, Dict, Any, Union
 from fastapi import HTTPException, status
-from database.connection import SessionLocal
+from sqlalchemy.orm import Session
 from database.repositories import EmpleadoRepository, AreaRepository
-from models.database import EmpleadoCreate, EmpleadoResponse, Empleado
-from datetime import datetime, timezone
+from services import biometric_cache
+from models.database import EmpleadoCreate, Empleado
 from fastapi import HTTPException, status
-from utils.crypto_utils import VectorEncryption
+from utils.crypto_utils import get_vector_encryption, hash_pin
 
 class EmpleadoService:
-    def __init__(self):
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.empleado_repo = EmpleadoRepository(self.session)
         self.area_repo = AreaRepository(self.session)
     
@@ -42,10 +42,8 @@ class EmpleadoService:
         
         # Construir la respuesta con los datos necesarios
         items = []
-        for emp in empleados:
-            # Verificar si el empleado tiene datos biométricos
-            tiene_biometricos = emp.vector_cifrado is not None and emp.iv is not None
-            
+        # tiene_biometricos viene calculado en la consulta, sin traer los vectores cifrados
+        for emp, tiene_biometricos in empleados:
             # Obtener el nombre del área si existe
             area_nombre = emp.area.Nombre if emp.area else "Sin área asignada"
             
@@ -58,7 +56,7 @@ class EmpleadoService:
                 "FechaNacimiento": emp.FechaNacimiento if emp.FechaNacimiento else None,
                 "AreaID": emp.AreaID,
                 "AreaNombre": area_nombre,
-                "Rol": emp.Rol.value if hasattr(emp.Rol, 'value') else emp.Rol,
+                "Rol": emp.Rol,
                 "Estado": emp.estado,
                 "TieneBiometricos": tiene_biometricos,
                 "FechaRegistro": emp.FechaRegistro if emp.FechaRegistro else None,
@@ -85,23 +83,33 @@ class EmpleadoService:
             "pagination": pagination
         }
     
-    def get_empleado(self, empleado_id: int):
+    def _to_response(self, empleado: Empleado) -> Dict[str, Any]:
+        """Arma el dict público de un empleado con los campos de EmpleadoResponse.
+        
+        Los datos ya vienen tipados desde la base, así que se evita construir y
+        validar un modelo Pydantic por cada empleado.
+        """
+        return {
+            "EmpleadoID": empleado.EmpleadoID,
+            "Nombre": empleado.Nombre,
+            "Apellido": empleado.Apellido,
+            "DNI": empleado.DNI,
+            "FechaNacimiento": empleado.FechaNacimiento,
+            "Email": empleado.Email,
+            "Rol": empleado.Rol,
+            "EstadoEmpleado": empleado.EstadoEmpleado,
+            "AreaID": empleado.AreaID,
+            "AreaNombre": None,
+            "TieneBiometricos": bool(empleado.vector_cifrado and empleado.iv),
+            "FechaRegistro": empleado.FechaRegistro
+        }
+    
+    def get_empleado(self, empleado_id: int) -> Dict[str, Any]:
         """Obtiene un empleado por ID"""
         empleado = self.empleado_repo.get_by_id(empleado_id)
         if not empleado:
             raise HTTPException(status_code=404, detail="Empleado no encontrado")
-        return EmpleadoResponse(
-            EmpleadoID=empleado.EmpleadoID,
-            Nombre=empleado.Nombre,
-            Apellido=empleado.Apellido,
-            DNI=empleado.DNI,
-            FechaNacimiento=empleado.FechaNacimiento,
-            Email=empleado.Email,
-            Rol=empleado.Rol.value if hasattr(empleado.Rol, 'value') else str(empleado.Rol),
-            EstadoEmpleado=empleado.EstadoEmpleado.value if hasattr(empleado.EstadoEmpleado, 'value') else str(empleado.EstadoEmpleado),
-            AreaID=empleado.AreaID,
-            FechaRegistro=empleado.FechaRegistro
-        )
+        return self._to_response(empleado)
     
     def get_empleado_completo(self, empleado_id: int, include_facial_vector: bool = False) -> Dict[str, Any]:
         """Obtiene un empleado completo con datos sensibles.
@@ -127,10 +135,10 @@ class EmpleadoService:
             "DNI": empleado.DNI,
             "FechaNacimiento": empleado.FechaNacimiento,
             "Email": empleado.Email,
-            "Rol": empleado.Rol.value if hasattr(empleado.Rol, 'value') else str(empleado.Rol),
-            "EstadoEmpleado": empleado.EstadoEmpleado.value if hasattr(empleado.EstadoEmpleado, 'value') else str(empleado.EstadoEmpleado),
+            "Rol": empleado.Rol,
+            "EstadoEmpleado": empleado.EstadoEmpleado,
             "AreaID": empleado.AreaID,
-            "PIN": empleado.PIN,
+            "TienePIN": bool(empleado.PINHash or empleado.PIN),
             "estado": empleado.estado,
             "FechaRegistro": empleado.FechaRegistro,
             "tiene_vector_facial": bool(empleado.vector_cifrado and empleado.iv)
@@ -144,30 +152,26 @@ class EmpleadoService:
             
         return result
     
-    def _encrypt_facial_vector(self, vector: List[float]) -> Dict[str, str]:
-        """Encrypt a facial vector and return the encrypted data and IV."""
-        if not vector:
+    def _encrypt_facial_vector(self, vector: Union[List[float], np.ndarray]) -> Dict[str, bytes]:
+        """Encrypt a facial vector and return the encrypted data and IV as raw bytes."""
+        if vector is None or len(vector) == 0:
             return {"vector_cifrado": None, "iv": None}
             
-        crypto = VectorEncryption()
-        encrypted_data, iv = crypto.encrypt_vector(vector)
+        encrypted_data, iv = get_vector_encryption().encrypt_vector(vector)
         
-        # Convert binary data to base64 for storage in Text field
+        # Stored as-is in the binary vector_cifrado / iv columns
         return {
-            "vector_cifrado": base64.b64encode(encrypted_data).decode('utf-8'),
-            "iv": base64.b64encode(iv).decode('utf-8')
+            "vector_cifrado": encrypted_data,
+            "iv": iv
         }
     
-    def _decrypt_facial_vector(self, encrypted_b64: str, iv_b64: str) -> Optional[List[float]]:
-        """Decrypt a facial vector from base64-encoded encrypted data and IV."""
-        if not encrypted_b64 or not iv_b64:
+    def _decrypt_facial_vector(self, encrypted_data: bytes, iv: bytes) -> Optional[List[float]]:
+        """Decrypt a facial vector from its encrypted data and IV."""
+        if not encrypted_data or not iv:
             return None
             
         try:
-            crypto = VectorEncryption()
-            encrypted_data = base64.b64decode(encrypted_b64)
-            iv = base64.b64decode(iv_b64)
-            return crypto.decrypt_vector(encrypted_data, iv)
+            return get_vector_encryption().decrypt_vector(encrypted_data, iv)
         except Exception as e:
             # Log the error but don't fail the request
             print(f"Error decrypting facial vector: {str(e)}")
@@ -181,10 +185,7 @@ class EmpleadoService:
             facial_vector: Vector facial opcional (lista de floats)
         """
         # Verificar si el DNI o Email ya existen
-        existing_employee = self.empleado_repo.get_by_dni_or_email(
-            empleado_data.DNI, empleado_data.Email
-        )
-        if existing_employee:
+        if self.empleado_repo.find_id_by_dni_or_email(empleado_data.DNI, empleado_data.Email) is not None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="DNI o Email ya registrados"
@@ -202,8 +203,7 @@ class EmpleadoService:
         if facial_vector is not None:
             encrypted_data = self._encrypt_facial_vector(facial_vector)
         
-        # Crear empleado
-        now = datetime.now(timezone.utc).isoformat()  # Hora en UTC con offset +00:00
+        # Crear empleado (FechaRegistro la asigna la base con now())
         empleado_dict = {
             "Nombre": empleado_data.Nombre,
             "Apellido": empleado_data.Apellido,
@@ -213,28 +213,17 @@ class EmpleadoService:
             "Rol": empleado_data.Rol.value,
             "EstadoEmpleado": empleado_data.EstadoEmpleado.value,
             "AreaID": empleado_data.AreaID,
-            "PIN": empleado_data.PIN,
-            "FechaRegistro": now,
+            "PINHash": hash_pin(empleado_data.PIN) if empleado_data.PIN else None,
             "estado": "activo",
             **encrypted_data
         }
         
         try:
             empleado = self.empleado_repo.create(empleado_dict)
+            biometric_cache.invalidate()
             return {
                 "message": "Empleado creado correctamente",
-                "empleado": EmpleadoResponse(
-                    EmpleadoID=empleado.EmpleadoID,
-                    Nombre=empleado.Nombre,
-                    Apellido=empleado.Apellido,
-                    DNI=empleado.DNI,
-                    FechaNacimiento=empleado.FechaNacimiento,
-                    Email=empleado.Email,
-                    Rol=empleado.Rol.value if hasattr(empleado.Rol, 'value') else str(empleado.Rol),
-                    EstadoEmpleado=empleado.EstadoEmpleado.value if hasattr(empleado.EstadoEmpleado, 'value') else str(empleado.EstadoEmpleado),
-                    AreaID=empleado.AreaID,
-                    FechaRegistro=empleado.FechaRegistro
-                ).dict()
+                "empleado": self._to_response(empleado)
             }
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al crear empleado: {str(e)}")
@@ -266,8 +255,7 @@ class EmpleadoService:
         if 'DNI' in empleado_data or 'Email' in empleado_data:
             dni = empleado_data.get('DNI', empleado.DNI)
             email = empleado_data.get('Email', empleado.Email)
-            existing = self.empleado_repo.get_by_dni_or_email(dni, email)
-            if existing and existing.EmpleadoID != empleado_id:
+            if self.empleado_repo.find_id_by_dni_or_email(dni, email, exclude_id=empleado_id) is not None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, 
                     detail="DNI o Email ya registrados"
@@ -280,6 +268,11 @@ class EmpleadoService:
                 detail=f"Área con ID '{empleado_data['AreaID']}' no encontrada"
             )
         
+        # El PIN nunca se guarda en texto plano
+        if 'PIN' in empleado_data:
+            pin = empleado_data.pop('PIN')
+            empleado_data['PINHash'] = hash_pin(pin) if pin else None
+        
         # Actualizar el vector facial si se proporciona
         if facial_vector is not None:
             encrypted_data = self._encrypt_facial_vector(facial_vector)
@@ -288,6 +281,7 @@ class EmpleadoService:
         # Actualizar empleado
         try:
             updated_empleado = self.empleado_repo.update(empleado_id, empleado_data)
+            biometric_cache.invalidate()
             
             # Construir respuesta
             response_data = {
@@ -298,8 +292,8 @@ class EmpleadoService:
                     "Apellido": updated_empleado.Apellido,
                     "DNI": updated_empleado.DNI,
                     "Email": updated_empleado.Email,
-                    "Rol": updated_empleado.Rol.value if hasattr(updated_empleado.Rol, 'value') else str(updated_empleado.Rol),
-                    "EstadoEmpleado": updated_empleado.EstadoEmpleado.value if hasattr(updated_empleado.EstadoEmpleado, 'value') else str(updated_empleado.EstadoEmpleado),
+                    "Rol": updated_empleado.Rol,
+                    "EstadoEmpleado": updated_empleado.EstadoEmpleado,
                     "AreaID": updated_empleado.AreaID,
                     "estado": updated_empleado.estado,
                     "tiene_vector_facial": bool(updated_empleado.vector_cifrado and updated_empleado.iv)
@@ -315,24 +309,31 @@ class EmpleadoService:
                 detail=f"Error al actualizar empleado: {str(e)}"
             )
     
-    def register_face(self, empleado_id: int, face_encoding_json: str):
-        """Registra el rostro de un empleado"""
+    def register_face(self, empleado_id: int, face_encoding: Union[List[float], np.ndarray, str, bytes]):
+        """Registra el rostro de un empleado
+        
+        Args:
+            empleado_id: ID del empleado
+            face_encoding: Encoding facial como lista de floats o array de numpy;
+                también se acepta serializado en JSON
+        """
         empleado = self.empleado_repo.get_by_id(empleado_id)
         if not empleado:
             raise HTTPException(status_code=404, detail="Empleado no encontrado")
         
         # Encrypt the face encoding
-        face_encoding = json.loads(face_encoding_json)
+        if isinstance(face_encoding, (str, bytes)):
+            face_encoding = orjson.loads(face_encoding)
         encrypted_result = self._encrypt_facial_vector(face_encoding)
         
         if not encrypted_result["vector_cifrado"] or not encrypted_result["iv"]:
             raise HTTPException(status_code=500, detail="Error al encriptar el vector facial")
             
-        encrypted_data_b64 = encrypted_result["vector_cifrado"]
-        iv_b64 = encrypted_result["iv"]
-        
-        success = self.empleado_repo.update_biometric_data(empleado_id, encrypted_data_b64, iv_b64)
+        success = self.empleado_repo.update_biometric_data(
+            empleado_id, encrypted_result["vector_cifrado"], encrypted_result["iv"]
+        )
         if success:
+            biometric_cache.invalidate()
             return {"message": "Rostro registrado correctamente"}
         else:
             raise HTTPException(status_code=500, detail="Error al registrar rostro")
@@ -343,32 +344,22 @@ class EmpleadoService:
         if not empleado:
             raise HTTPException(status_code=404, detail="Empleado no encontrado")
         
+        # Se arma antes de borrar: después del commit el objeto ya no se puede leer
+        empleado_eliminado = self._to_response(empleado)
+        
         try:
-            # Eliminar accesos del empleado
+            # Accesos y empleado se eliminan en una sola transacción
             from database.repositories import AccesoRepository
             acceso_repo = AccesoRepository(self.session)
-            acceso_repo.delete_by_empleado_id(empleado_id)
-            
-            # Eliminar empleado
-            self.empleado_repo.delete(empleado_id)
+            acceso_repo.delete_by_empleado_id(empleado_id, commit=False)
+            self.empleado_repo.delete(empleado_id, commit=False)
+            self.session.commit()
+            biometric_cache.invalidate()
             
             return {
                 "message": "Empleado eliminado correctamente",
-                "empleado_eliminado": EmpleadoResponse(
-                    EmpleadoID=empleado.EmpleadoID,
-                    Nombre=empleado.Nombre,
-                    Apellido=empleado.Apellido,
-                    DNI=empleado.DNI,
-                    FechaNacimiento=empleado.FechaNacimiento,
-                    Email=empleado.Email,
-                    Rol=empleado.Rol.value if hasattr(empleado.Rol, 'value') else str(empleado.Rol),
-                    EstadoEmpleado=empleado.EstadoEmpleado.value if hasattr(empleado.EstadoEmpleado, 'value') else str(empleado.EstadoEmpleado),
-                    AreaID=empleado.AreaID,
-                    FechaRegistro=empleado.FechaRegistro
-                ).dict()
+                "empleado_eliminado": empleado_eliminado
             }
         except Exception as e:
+            self.session.rollback()
             raise HTTPException(status_code=500, detail=f"Error al eliminar empleado: {str(e)}")
-    
-    def __del__(self):
-        self.session.close()
@@ -0,0 +1,104 @@
+import numpy as np
+
+# Por debajo de este tamaño la búsqueda exacta es más barata que mantener clusters
+MIN_CLUSTERED_SIZE = 1024
+# Cantidad de clusters más cercanos a la consulta en los que se busca
+CLUSTERS_TO_SEARCH = 2
+# Iteraciones de k-means al reconstruir los clusters
+KMEANS_ITERATIONS = 10
+
+class EncodingIndex:
+    """Índice en memoria de los encodings faciales enrolados.
+
+    Con pocos encodings compara contra todos. A partir de MIN_CLUSTERED_SIZE los
+    agrupa con k-means (K ≈ √N) y cada búsqueda solo recorre los clusters más
+    cercanos a la consulta, bajando el costo de O(N) a O(√N).
+
+    Los encodings se guardan como float32 contiguo junto con sus normas al
+    cuadrado, de modo que cada búsqueda es un único producto matriz-vector
+    (|e - q|² = |e|² + |q|² - 2·e·q) sin restas ni raíces por fila.
+    """
+
+    def __init__(self, ids, encodings, previous=None):
+        """
+        Args:
+            ids: EmpleadoID de cada fila de encodings
+            encodings: Matriz (N, 128) con los encodings descifrados
+            previous: Índice anterior; si la cantidad de encodings no creció más
+                de un 20% se reutilizan sus centroides sin volver a correr k-means
+        """
+        self.ids = list(ids)
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        self.sq_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        self.centroids = None
+        self.clusters = None
+        self.clustered_size = 0
+
+        if len(self.ids) >= MIN_CLUSTERED_SIZE:
+            if previous is not None and not previous.needs_rebuild(len(self.ids)):
+                centroids = previous.centroids
+                self.clustered_size = previous.clustered_size
+            else:
+                centroids = self._kmeans()
+            self._assign(centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _nearest_centroid(self, centroids):
+        """Índice del centroide más cercano a cada encoding"""
+        # |x - c|² = |x|² - 2·x·c + |c|²; |x|² es constante por fila y no cambia el argmin
+        d2 = (centroids * centroids).sum(axis=1) - 2 * (self.encodings @ centroids.T)
+        return np.argmin(d2, axis=1)
+
+    def _kmeans(self):
+        """Calcula K ≈ √N centroides con el algoritmo de Lloyd"""
+        n = len(self.encodings)
+        k = int(np.sqrt(n))
+        rng = np.random.default_rng(0)
+        centroids = self.encodings[rng.choice(n, size=k, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = self._nearest_centroid(centroids)
+            for c in range(k):
+                miembros = self.encodings[labels == c]
+                if len(miembros):
+                    centroids[c] = miembros.mean(axis=0)
+        self.clustered_size = n
+        return centroids
+
+    def _assign(self, centroids):
+        """Agrupa las filas por su centroide más cercano"""
+        labels = self._nearest_centroid(centroids)
+        self.centroids = centroids
+        self.clusters = [np.flatnonzero(labels == c) for c in range(len(centroids))]
+
+    def needs_rebuild(self, size):
+        """Indica si un índice de `size` encodings debe recalcular los clusters
+        en lugar de reutilizar estos centroides (crecimiento mayor al 20%)"""
+        return self.centroids is None or size > 1.2 * self.clustered_size
+
+    def search(self, query):
+        """Busca el encoding más cercano a la consulta
+
+        Returns:
+            Tupla (posición en ids, distancia euclidiana al cuadrado)
+        """
+        q = np.asarray(query, dtype=np.float32)
+
+        candidatos = None
+        if self.clusters is not None:
+            d2_centroides = (self.centroids * self.centroids).sum(axis=1) - 2 * (self.centroids @ q)
+            cercanos = np.argsort(d2_centroides)[:CLUSTERS_TO_SEARCH]
+            candidatos = np.concatenate([self.clusters[c] for c in cercanos])
+            if candidatos.size == 0:
+                candidatos = None
+
+        # |q|² es igual para todas las filas: se elige el mínimo de |e|² - 2·e·q
+        # (un único producto matriz-vector) y |q|² se suma solo al ganador
+        if candidatos is None:
+            parcial = self.sq_norms - 2 * (self.encodings @ q)
+        else:
+            parcial = self.sq_norms[candidatos] - 2 * (self.encodings[candidatos] @ q)
+        mejor = int(np.argmin(parcial))
+        distancia2 = max(float(parcial[mejor] + q @ q), 0.0)
+        return (mejor if candidatos is None else int(candidatos[mejor])), distancia2
@@ -1,80 +1,141 @@
+import asyncio
+import dlib
 import face_recognition
+import hashlib
 import io
-import json
+import multiprocessing
+import os
+import threading
+import time
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image
+
+# Pool para la decodificación y el encoding facial. dlib libera el GIL durante
+# face_encodings, así que por defecto un pool de hilos alcanza para no bloquear
+# el event loop. Con FACE_ENCODING_EXECUTOR=process la decodificación y la
+# detección HOG, que sí retienen el GIL, corren en paralelo en procesos aparte
+# (cada uno carga sus propios modelos de dlib; no usar con GPU).
+FACE_ENCODING_WORKERS = int(os.getenv("FACE_ENCODING_WORKERS", str(os.cpu_count())))
+if os.getenv("FACE_ENCODING_EXECUTOR", "thread") == "process":
+    # spawn en lugar de fork: el proceso del servidor ya tiene hilos en ejecución
+    ENC_POOL = ProcessPoolExecutor(
+        max_workers=FACE_ENCODING_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+else:
+    ENC_POOL = ThreadPoolExecutor(max_workers=FACE_ENCODING_WORKERS)
+
+# Lado máximo en píxeles de las imágenes usadas para reconocimiento en tiempo real.
+# El costo de face_encodings escala con la cantidad de píxeles.
+MAX_IMAGE_DIMENSION = 640
+
+# dlib compilado con CUDA ejecuta en GPU tanto la red de encoding (ResNet) como
+# el detector CNN; sin GPU se mantiene la ruta por CPU
+DLIB_USE_CUDA = bool(getattr(dlib, "DLIB_USE_CUDA", False)) and dlib.cuda.get_num_devices() > 0
+
+# Modelos de face_recognition. Con FACE_DETECTION_MODEL=cnn la detección usa la
+# red CNN de dlib; es la opción por defecto cuando hay GPU disponible.
+# FACE_ENCODING_MODEL=large usa el predictor de 68 puntos para alinear el rostro.
+FACE_DETECTION_MODEL = os.getenv("FACE_DETECTION_MODEL", "cnn" if DLIB_USE_CUDA else "hog")
+FACE_ENCODING_MODEL = os.getenv("FACE_ENCODING_MODEL", "small")
+
+# Ubicaciones de rostros detectadas recientemente, por hash de la imagen y escala.
+# Si un dispositivo reintenta con la misma imagen se salta la detección y solo se
+# calcula el encoding. Con FACE_ENCODING_EXECUTOR=process cada proceso tiene el suyo.
+FACE_LOCATION_CACHE_TTL = float(os.getenv("FACE_LOCATION_CACHE_TTL", "30"))
+FACE_LOCATION_CACHE_SIZE = 256
+_ubicaciones = OrderedDict()  # (hash, max_dimension) -> (ubicaciones, momento)
+_ubicaciones_lock = threading.Lock()
+
+def _clave_imagen(image_bytes, max_dimension):
+    """Clave del caché de ubicaciones para una imagen procesada a max_dimension"""
+    return hashlib.blake2b(image_bytes, digest_size=16).digest(), max_dimension
+
+def _ubicaciones_cacheadas(clave):
+    """Ubicaciones guardadas para la clave, o None si no hay o vencieron"""
+    with _ubicaciones_lock:
+        entrada = _ubicaciones.get(clave)
+        if entrada is None:
+            return None
+        if time.monotonic() - entrada[1] > FACE_LOCATION_CACHE_TTL:
+            del _ubicaciones[clave]
+            return None
+        return entrada[0]
+
+def _guardar_ubicaciones(clave, ubicaciones):
+    """Guarda las ubicaciones descartando las más antiguas si se supera el tamaño"""
+    with _ubicaciones_lock:
+        _ubicaciones[clave] = (ubicaciones, time.monotonic())
+        _ubicaciones.move_to_end(clave)
+        while len(_ubicaciones) > FACE_LOCATION_CACHE_SIZE:
+            _ubicaciones.popitem(last=False)
 
 class FaceRecognitionService:
     def __init__(self, threshold=0.6):
         self.threshold = threshold
     
-    def extract_face_encoding(self, image_bytes):
-        """Extrae el encoding facial de una imagen"""
-        imagen = face_recognition.load_image_file(io.BytesIO(image_bytes))
-        encodings = face_recognition.face_encodings(imagen)
+    def _load_image(self, image_bytes, max_dimension=None):
+        """Decodifica la imagen a RGB, reduciéndola si su lado mayor supera max_dimension"""
+        imagen = Image.open(io.BytesIO(image_bytes))
+        if max_dimension and max(imagen.size) > max_dimension:
+            # Para JPEG, draft hace que libjpeg-turbo decodifique ya escalado (1/2, 1/4
+            # o 1/8) al menor tamaño que no quede por debajo del final; se le pasa el
+            # tamaño final con la relación de aspecto de la imagen, si no, no reduce
+            ancho, alto = imagen.size
+            escala = max_dimension / max(ancho, alto)
+            imagen.draft("RGB", (int(ancho * escala), int(alto * escala)))
+            # thumbnail conserva la relación de aspecto y termina de reducir
+            imagen.thumbnail((max_dimension, max_dimension), Image.BOX)
+        return np.array(imagen.convert("RGB"))
+    
+    def extract_face_encoding(self, image_bytes, max_dimension=MAX_IMAGE_DIMENSION,
+                              known_face_locations=None):
+        """Extrae el encoding facial de una imagen
+        
+        Args:
+            image_bytes: Contenido de la imagen subida
+            max_dimension: Lado máximo al que se reduce la imagen antes del encoding.
+                None procesa la imagen a resolución completa.
+            known_face_locations: Ubicaciones (top, right, bottom, left) ya conocidas
+                en la imagen reducida; si se pasan no se corre el detector
+        """
+        imagen = self._load_image(image_bytes, max_dimension)
+        ubicaciones = known_face_locations
+        if ubicaciones is None:
+            clave = _clave_imagen(image_bytes, max_dimension)
+            ubicaciones = _ubicaciones_cacheadas(clave)
+            if ubicaciones is None:
+                ubicaciones = face_recognition.face_locations(imagen, model=FACE_DETECTION_MODEL)
+                _guardar_ubicaciones(clave, ubicaciones)
+        encodings = face_recognition.face_encodings(
+            imagen, known_face_locations=ubicaciones, model=FACE_ENCODING_MODEL
+        )
         if len(encodings) == 0:
             raise ValueError("No se detectó rostro en la imagen")
         return encodings[0].tolist()
     
-    def compare_faces(self, face_encoding, stored_encodings):
-        """Compara un encoding facial con encodings almacenados"""
-        from utils.crypto_utils import VectorEncryption  # Importar aquí para evitar importación circular
-        
-        face_array = np.array(face_encoding)
-        mejor_empleado = None
-        mejor_confianza = self.threshold
-        
-        crypto = VectorEncryption()
+    async def extract_face_encoding_async(self, image_bytes, max_dimension=MAX_IMAGE_DIMENSION,
+                                          known_face_locations=None):
+        """Extrae el encoding facial en ENC_POOL sin bloquear el event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            ENC_POOL, self.extract_face_encoding, image_bytes, max_dimension, known_face_locations
+        )
+    
+    def compare_faces(self, face_encoding, index):
+        """Compara un encoding facial con el índice de encodings almacenados
         
-        for empleado in stored_encodings:
-            # Skip employees without biometric data
-            if not empleado.vector_cifrado or not empleado.iv:
-                continue
-                
-            try:
-                # Convert IV to bytes if it's a string
-                iv = empleado.iv
-                if isinstance(iv, str):
-                    if iv.startswith('b\'') and iv.endswith('\''):
-                        # Handle string representation of bytes
-                        iv = iv[2:-1].encode('latin-1')
-                    else:
-                        # Handle base64 encoded string
-                        import base64
-                        iv = base64.b64decode(iv)
-                
-                # Decrypt the stored face encoding
-                decrypted_data = crypto.decrypt_vector(
-                    empleado.vector_cifrado,
-                    iv
-                )
-                
-                # If decrypted_data is already a list, use it directly
-                if isinstance(decrypted_data, list):
-                    encoding_guardado = np.array(decrypted_data)
-                else:
-                    # Otherwise, try to parse it as JSON
-                    if isinstance(decrypted_data, bytes):
-                        decrypted_data = decrypted_data.decode('utf-8')
-                    encoding_guardado = np.array(json.loads(decrypted_data))
-                
-                # Calculate distance between face encodings
-                distancia = np.linalg.norm(face_array - encoding_guardado)
-                
-                if distancia < mejor_confianza:
-                    mejor_confianza = distancia
-                    mejor_empleado = empleado
-                    
-            except Exception as e:
-                # Log the error with more details
-                import traceback
-                print(f"Error procesando datos biométricos del empleado {getattr(empleado, 'EmpleadoID', 'unknown')}:")
-                print(f"IV type: {type(getattr(empleado, 'iv', None))}")
-                print(f"IV value: {getattr(empleado, 'iv', None)}")
-                print(f"Error: {str(e)}")
-                print(traceback.format_exc())
-                continue
+        Returns:
+            Tupla (EmpleadoID, confianza) del empleado reconocido, o (None, None)
+        """
+        if index is None:
+            return None, None
         
-        if mejor_empleado is not None:
-            return mejor_empleado, float(1 - mejor_confianza)  # Convertir a float de Python
+        # Se compara la distancia al cuadrado contra el umbral al cuadrado; la raíz
+        # solo se calcula para informar la confianza del empleado reconocido
+        posicion, distancia2 = index.search(face_encoding)
+        if distancia2 < self.threshold ** 2:
+            return index.ids[posicion], float(1 - np.sqrt(distancia2))  # Convertir a float de Python
             
         return None, None
@@ -1,8 +1,12 @@
 import os
+import ast
 import json
 import base64
-from typing import List, Tuple
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import hashlib
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+import numpy as np
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.exceptions import InvalidTag
 import logging
 
@@ -14,7 +18,84 @@ class VectorEncryptionError(Exception):
     """Custom exception for vector encryption/decryption errors"""
     pass
 
+# Plaintext layout of encrypted vectors: a format version byte followed by the
+# vector as little-endian float32 (512 bytes for a 128-D face encoding). The
+# version byte is encrypted too, so it is covered by the GCM tag. Vectors
+# encrypted before this layout hold JSON text, which always starts with "[".
+VECTOR_FORMAT_FLOAT32 = b'\x01'
+VECTOR_DTYPE = np.dtype('<f4')
+
+# Vectors encrypted with ChaCha20-Poly1305 store this byte in front of their
+# 12-byte nonce (13-byte IV); 12-byte IVs are AES-GCM, as before.
+CIPHER_CHACHA20 = b'\x02'
+
+# "aesgcm", "chacha20" or "auto": AES-GCM when the CPU has AES and carry-less
+# multiply instructions, ChaCha20-Poly1305 otherwise. Both are always readable.
+VECTOR_CIPHER = os.getenv("VECTOR_CIPHER", "auto")
+
+@lru_cache(maxsize=1)
+def _cpu_has_aes_acceleration() -> bool:
+    """Whether /proc/cpuinfo reports AES-NI + PCLMULQDQ (x86) or AES + PMULL (ARM); probed once per process."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(f.read().split())
+    except OSError:
+        # No cpuinfo (macOS, Windows): keep AES-GCM
+        return True
+    return "aes" in flags and ("pclmulqdq" in flags or "pmull" in flags)
+
+def _parse_json_plaintext(decrypted_data: bytes) -> List[float]:
+    """Parse the JSON text plaintext of vectors encrypted before the float32 layout."""
+    decrypted_data = decrypted_data.decode('utf-8')
+    try:
+        vector = json.loads(decrypted_data)
+    except json.JSONDecodeError:
+        # If it's not valid JSON, try to parse it as a string representation of a list
+        try:
+            # Handle string like "[1.0, 2.0, 3.0]"
+            vector = ast.literal_eval(decrypted_data)
+        except (ValueError, SyntaxError):
+            raise ValueError("Could not parse decrypted data as a list")
+    
+    # Validate the decrypted data
+    if not isinstance(vector, list) or not all(isinstance(x, (int, float)) for x in vector):
+        raise ValueError("Decrypted data is not a valid vector")
+    return vector
+
+def _serialize_vector(vector) -> bytes:
+    """Pack a vector as the versioned float32 plaintext."""
+    return VECTOR_FORMAT_FLOAT32 + np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+# Raw key sizes accepted by AES-GCM (AES-128, AES-192, AES-256)
+_VALID_KEY_LENGTHS = frozenset((16, 24, 32))
+
+@lru_cache(maxsize=4)
+def _decode_key(key_str) -> bytes:
+    """Decode and validate a base64 key; memoized so repeated constructions skip it."""
+    try:
+        key = base64.urlsafe_b64decode(key_str)
+    except Exception as e:
+        raise VectorEncryptionError(f"Invalid encryption key: {str(e)}")
+    if len(key) not in _VALID_KEY_LENGTHS:
+        raise VectorEncryptionError(
+            f"Invalid encryption key: decoded key must be 16, 24, or 32 bytes long after "
+            f"base64 decoding. Got {len(key)} bytes."
+        )
+    return key
+
+@lru_cache(maxsize=4)
+def _get_aesgcm(key: bytes) -> AESGCM:
+    """Return the AESGCM cipher for a key, set up once per key and process."""
+    return AESGCM(key)
+
+@lru_cache(maxsize=4)
+def _get_chacha20(key: bytes) -> ChaCha20Poly1305:
+    """Return the ChaCha20-Poly1305 cipher for a 32-byte key, set up once per key."""
+    return ChaCha20Poly1305(key)
+
 class VectorEncryption:
+    IV_LENGTH = 12  # 12 bytes for GCM is recommended
+
     def __init__(self, key: bytes = None):
         """
         Initialize the VectorEncryption with a key.
@@ -25,120 +106,178 @@ class VectorEncryption:
         if not key_str:
             raise VectorEncryptionError("VECTOR_ENCRYPTION_KEY environment variable is not set.")
             
-        try:
-            # Decode the base64 key to get raw bytes
-            self.key = base64.urlsafe_b64decode(key_str)
-            if len(self.key) not in [16, 24, 32]:
-                raise VectorEncryptionError(
-                    f"Decoded key must be 16, 24, or 32 bytes long after base64 decoding. "
-                    f"Got {len(self.key)} bytes."
-                )
-        except Exception as e:
-            raise VectorEncryptionError(f"Invalid encryption key: {str(e)}")
-        self.aesgcm = AESGCM(self.key)
-        self.iv_length = 12  # 12 bytes for GCM is recommended
+        # Decode the base64 key to get raw bytes
+        self.key = _decode_key(key_str)
+        self.aesgcm = _get_aesgcm(self.key)
+        
+        # ChaCha20-Poly1305 needs a 256-bit key; shorter keys always use AES-GCM
+        self.chacha = _get_chacha20(self.key) if len(self.key) == 32 else None
+        use_chacha = VECTOR_CIPHER == "chacha20" or (
+            VECTOR_CIPHER == "auto" and not _cpu_has_aes_acceleration()
+        )
+        if use_chacha and self.chacha is not None:
+            self._encrypt, self._iv_prefix = self.chacha.encrypt, CIPHER_CHACHA20
+        else:
+            self._encrypt, self._iv_prefix = self.aesgcm.encrypt, b''
+
+    def _cipher_for(self, iv: bytes):
+        """Return the (decrypt function, nonce) that matches a stored IV."""
+        if len(iv) == self.IV_LENGTH + 1 and iv[:1] == CIPHER_CHACHA20:
+            if self.chacha is None:
+                raise VectorEncryptionError("ChaCha20-Poly1305 vectors require a 32-byte key")
+            return self.chacha.decrypt, iv[1:]
+        return self.aesgcm.decrypt, iv
 
     def encrypt_vector(self, vector: List[float]) -> Tuple[bytes, bytes]:
         """
         Encrypt a facial vector.
         
+        The vector is stored as float32, the precision the encodings are
+        compared with.
+        
         Args:
-            vector: List of floats representing the facial vector
+            vector: List of floats or 1-D array (float32 or float64) representing the facial vector
             
         Returns:
-            Tuple of (encrypted_data, iv) where both are bytes
+            Tuple of (encrypted_data, iv) where both are bytes; with ChaCha20-Poly1305
+            the iv carries a one-byte cipher tag before the 12-byte nonce
         """
         try:
-            # Serialize the vector to JSON and encode to bytes
-            vector_serialized = json.dumps(vector).encode('utf-8')
+            vector_serialized = _serialize_vector(vector)
             
             # Generate a random IV
-            iv = os.urandom(self.iv_length)
+            iv = os.urandom(self.IV_LENGTH)
             
             # Encrypt the vector
-            encrypted_data = self.aesgcm.encrypt(iv, vector_serialized, None)
+            encrypted_data = self._encrypt(iv, vector_serialized, None)
             
-            return encrypted_data, iv
+            return encrypted_data, self._iv_prefix + iv
             
         except Exception as e:
             logger.error(f"Error encrypting vector: {str(e)}")
             raise VectorEncryptionError(f"Failed to encrypt vector: {str(e)}")
 
-    def decrypt_vector(self, encrypted_data: bytes, iv) -> List[float]:
+    def encrypt_vectors_batch(self, vectors: List[List[float]]) -> List[Tuple[bytes, bytes]]:
+        """
+        Encrypt many facial vectors in one call.
+        
+        Reuses this instance's AES-GCM key schedule for every row and draws all
+        IVs from a single os.urandom call. Each vector still gets its own IV and
+        authentication tag, so the results are interchangeable with encrypt_vector.
+        
+        Args:
+            vectors: Sequence of facial vectors (lists of floats or a 2-D array)
+            
+        Returns:
+            List of (encrypted_data, iv) tuples, one per vector, in input order
+        """
+        try:
+            rows = np.asarray(vectors, dtype=VECTOR_DTYPE)
+            ivs = os.urandom(self.IV_LENGTH * len(rows))
+            encrypt, prefix = self._encrypt, self._iv_prefix
+            
+            results = []
+            for i, row in enumerate(rows):
+                iv = ivs[i * self.IV_LENGTH:(i + 1) * self.IV_LENGTH]
+                results.append((encrypt(iv, VECTOR_FORMAT_FLOAT32 + row.tobytes(), None), prefix + iv))
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error encrypting vector batch: {str(e)}")
+            raise VectorEncryptionError(f"Failed to encrypt vector batch: {str(e)}")
+
+    def decrypt_vectors_batch(self, items: Sequence[Tuple[bytes, bytes]],
+                              dimensions: int) -> Tuple[np.ndarray, List[int]]:
+        """
+        Decrypt many facial vectors straight into one float32 matrix.
+        
+        Each vector keeps its own IV and tag, as stored per employee, so every
+        row is still decrypted separately; the batch avoids building a Python
+        list per vector and copies each plaintext directly into its matrix row.
+        Rows that fail to decrypt or hold NaN/inf values are logged and skipped.
+        
+        Args:
+            items: Sequence of (encrypted_data, iv) pairs
+            dimensions: Length of every vector
+            
+        Returns:
+            Tuple of (matrix of shape (n, dimensions), indices into items of the
+            n rows that were decrypted, in order)
+        """
+        out = np.empty((len(items), dimensions), dtype=VECTOR_DTYPE)
+        plaintext_length = 1 + dimensions * VECTOR_DTYPE.itemsize
+        decrypted = []
+        
+        for i, (encrypted_data, iv) in enumerate(items):
+            try:
+                decrypt, nonce = self._cipher_for(iv)
+                plaintext = decrypt(nonce, encrypted_data, None)
+                if plaintext[:1] == VECTOR_FORMAT_FLOAT32 and len(plaintext) == plaintext_length:
+                    out[len(decrypted)] = np.frombuffer(plaintext, dtype=VECTOR_DTYPE, offset=1)
+                else:
+                    # Legacy JSON plaintext
+                    out[len(decrypted)] = _parse_json_plaintext(plaintext)
+                decrypted.append(i)
+            except Exception as e:
+                logger.error(f"Error decrypting vector {i} of batch: {e!r}")
+        
+        # A NaN row would win every argmin in the encoding index; checked once
+        # for the whole matrix instead of per row
+        out = out[:len(decrypted)]
+        finite = np.isfinite(out).all(axis=1)
+        if not finite.all():
+            for i in np.flatnonzero(~finite):
+                logger.error(f"Error decrypting vector {decrypted[i]} of batch: non-finite values")
+            out = out[finite]
+            decrypted = [i for i, ok in zip(decrypted, finite) if ok]
+        
+        return out, decrypted
+
+    def decrypt_vector(self, encrypted_data: bytes, iv: bytes, dimensions: int = 128) -> List[float]:
         """
         Decrypt an encrypted facial vector.
         
+        Accepts both the float32 layout and vectors encrypted as JSON text by
+        earlier versions. Ciphertext and IV must be bytes, as stored in the
+        BYTEA columns (databases that still hold base64 text are converted by
+        scripts.migrate_schema).
+        
         Args:
-            encrypted_data: Encrypted vector data (bytes or base64 string)
-            iv: Initialization vector (bytes, base64 string, or string representation of bytes)
+            encrypted_data: Encrypted vector data
+            iv: Initialization vector
+            dimensions: Expected length of the vector (128 for dlib face encodings)
             
         Returns:
             List of floats representing the original facial vector
             
         Raises:
-            VectorEncryptionError: If decryption fails
+            VectorEncryptionError: If decryption fails or the vector does not have
+                `dimensions` finite values
         """
         try:
-            # Convert IV to bytes if it's a string
-            if isinstance(iv, str):
-                if iv.startswith('b\'') and iv.endswith('\''):
-                    # Handle string representation of bytes (e.g., "b'...'")
-                    iv = iv[2:-1].encode('latin-1')
-                else:
-                    # Try to decode as base64
-                    try:
-                        iv = base64.b64decode(iv)
-                    except Exception:
-                        # If base64 decoding fails, try UTF-8 encoding
-                        iv = iv.encode('utf-8')
-            
-            # Ensure encrypted_data is bytes
-            if isinstance(encrypted_data, str):
-                try:
-                    encrypted_data = base64.b64decode(encrypted_data)
-                except Exception:
-                    encrypted_data = encrypted_data.encode('utf-8')
+            decrypt, nonce = self._cipher_for(iv)
+            decrypted_data = decrypt(nonce, encrypted_data, None)
             
-            logger.debug(f"IV type: {type(iv)}, IV value: {iv}")
-            logger.debug(f"Encrypted data type: {type(encrypted_data)}, length: {len(encrypted_data) if encrypted_data else 0}")
+            if decrypted_data[:1] == VECTOR_FORMAT_FLOAT32:
+                vector = np.frombuffer(decrypted_data, dtype=VECTOR_DTYPE, offset=1)
+            else:
+                vector = _parse_json_plaintext(decrypted_data)
             
-            # Decrypt the data
-            decrypted_data = self.aesgcm.decrypt(iv, encrypted_data, None)
-            
-            # If the data is already a list, return it directly
-            if isinstance(decrypted_data, list):
-                return decrypted_data
-                
-            # If it's bytes, decode it first
-            if isinstance(decrypted_data, bytes):
-                decrypted_data = decrypted_data.decode('utf-8')
-                
-            # If it's a string, try to parse it as JSON
-            if isinstance(decrypted_data, str):
-                try:
-                    vector = json.loads(decrypted_data)
-                    if not isinstance(vector, list):
-                        raise ValueError("Decrypted data is not a list")
-                except json.JSONDecodeError:
-                    # If it's not valid JSON, try to parse it as a string representation of a list
-                    try:
-                        # Handle string like "[1.0, 2.0, 3.0]"
-                        import ast
-                        vector = ast.literal_eval(decrypted_data)
-                        if not isinstance(vector, list):
-                            raise ValueError("Decrypted data is not a list")
-                    except (ValueError, SyntaxError):
-                        raise ValueError("Could not parse decrypted data as a list")
-            
-            # Validate the decrypted data
-            if not isinstance(vector, list) or not all(isinstance(x, (int, float)) for x in vector):
+            # Same checks decrypt_vectors_batch applies through its (n, dimensions) matrix
+            if len(vector) != dimensions or not np.isfinite(vector).all():
                 raise ValueError("Decrypted data is not a valid vector")
-                
-            return vector
+            return vector.tolist() if isinstance(vector, np.ndarray) else vector
             
-        except (InvalidTag, json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Error decrypting vector: {str(e)}", exc_info=True)
+        except InvalidTag:
+            # Expected for tampered rows or a wrong key: no traceback
+            logger.warning("Error decrypting vector: authentication tag mismatch")
+            raise VectorEncryptionError("Failed to decrypt vector: authentication tag mismatch")
+        except ValueError as e:
+            # Covers json.JSONDecodeError and malformed legacy plaintext
+            logger.warning(f"Error decrypting vector: {str(e)}")
             raise VectorEncryptionError(f"Failed to decrypt vector: {str(e)}")
+        except VectorEncryptionError:
+            raise
         except Exception as e:
             logger.error(f"Unexpected error during decryption: {str(e)}", exc_info=True)
             raise VectorEncryptionError(f"Failed to decrypt vector: {str(e)}")
@@ -151,6 +290,51 @@ class VectorEncryption:
         """
         return base64.b64encode(os.urandom(32)).decode('utf-8')
 
+@lru_cache(maxsize=1)
+def get_vector_encryption() -> VectorEncryption:
+    """
+    Return a process-wide VectorEncryption built from VECTOR_ENCRYPTION_KEY.
+    
+    The key is decoded and the AES-GCM key schedule set up only once. The
+    instance holds no per-call state, so it can be shared between threads.
+    """
+    return VectorEncryption()
+
+@lru_cache(maxsize=1)
+def _pin_hash_key() -> bytes:
+    """
+    Return the server secret used to key PIN hashes.
+    
+    PIN_HASH_KEY when set, otherwise the decoded VECTOR_ENCRYPTION_KEY (which keyed
+    PINHash values until PIN_HASH_KEY existed). Stored hashes cannot be recomputed
+    without the plain PINs, so changing this key means re-entering every PIN.
+    """
+    key_str = os.getenv("PIN_HASH_KEY") or os.getenv("VECTOR_ENCRYPTION_KEY")
+    if not key_str:
+        raise VectorEncryptionError("Neither PIN_HASH_KEY nor VECTOR_ENCRYPTION_KEY environment variable is set.")
+    return _decode_key(key_str)
+
+def hash_pin(pin: str) -> str:
+    """
+    Hash a PIN so it can be stored and looked up by exact match.
+    
+    Uses keyed BLAKE2b (with its own personalization string, so the digest is
+    unrelated to the vector encryption). Without the server key, the small PIN
+    space cannot be brute-forced from a database dump.
+    
+    Args:
+        pin: PIN in plain text
+        
+    Returns:
+        32-character hex digest
+    """
+    return hashlib.blake2b(
+        pin.encode('utf-8'),
+        key=_pin_hash_key(),
+        digest_size=16,
+        person=b'pyme-backend-pin'
+    ).hexdigest()
+
 # Example usage:
 if __name__ == "__main__":
     # Generate a new key (do this once and store it in your environment variables)
@@ -171,7 +355,7 @@ if __name__ == "__main__":
         
         # Decrypt
         decrypted = crypto.decrypt_vector(encrypted, iv)
-        print(f"Decryption successful: {decrypted == test_vector}")
+        print(f"Decryption successful: {np.allclose(decrypted, test_vector)}")
         
     except VectorEncryptionError as e:
         print(f"Error: {str(e)}")